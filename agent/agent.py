@@ -1,16 +1,19 @@
 import os
 import json
 from typing_extensions import TypedDict, List, Dict
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
+from langchain_google_genai import ChatGoogleGenerativeAI
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.metrics import (
-    silhouette_score,
-    calinski_harabasz_score,
-    davies_bouldin_score,
-)
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, START, END
+from corp_store import CorpStore, STORE_PATH
+from corp_index import CurrentIndex
+from filter_cache import FilterCache
+from query_cache import QueryCache
+from fast_parser import FastParser
+from embeddings import EMBEDDING_PROVIDER, view_name, make_provider
+from gazetteer import unit_vectors
+from qa import evaluate
+from clustering import CLUSTER_ENGINE, N_CLUSTERS, CentroidCache, run_engine
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -20,35 +23,47 @@ load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-LLM = ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=GOOGLE_API_KEY)
+LLM_MODEL = "gemini-1.5-flash"
 
-EMBEDDING = GoogleGenerativeAIEmbeddings(
-    model="models/text-embedding-004",
-    google_api_key=GOOGLE_API_KEY,
-    task_type="semantic_similarity",
-)
+LLM = ChatGoogleGenerativeAI(model=LLM_MODEL, google_api_key=GOOGLE_API_KEY)
 
 try:
-    with open("corp_data.json", "r") as f:
-        CORP_DATA = json.load(f)
+    CORP_INDEX = CurrentIndex(STORE_PATH)
 except FileNotFoundError:
-    logger.error("corp_data.json not found.")
+    logger.error(f"{STORE_PATH} not found, run preprocess.py first.")
     raise
 
-
-class State(TypedDict):
-    query: str
-    parsed_query: dict
-    filtered_corps: List[Dict]
-    clusters: np.ndarray
-    embeddings: np.ndarray
-    qa_result: Dict
-    error: str | None
-
-
-def parse_query(state: State, llm=LLM) -> State:
-    query = state["query"]
-    content = f"""
+# The store at startup, for the parser's and embedder's dictionaries.
+CORP_STORE = CORP_INDEX.get().store
+
+CENTROID_CACHE = CentroidCache()
+
+EMBEDDER = make_provider(EMBEDDING_PROVIDER, GOOGLE_API_KEY, CORP_STORE.themes)
+
+FILTER_CACHE = FilterCache()
+
+VALID_THEMES = [
+    "Analytics", "Digital Transformation", "Industry 4.0", "Automotive",
+    "Health Care", "Artificial Intelligence", "Smart Home", "Machine Learning",
+    "Consulting", "Smart Supply Chain", "Sharing Economy", "Robotics", "Training",
+    "Safety", "Market Research", "Cyber Security", "InsurTech", "Retail Technology",
+    "Cloud Computing", "Information Services", "Computer Vision", "Marketing",
+    "CRM", "LegalTech", "Augmented Reality", "Big Data", "Advertising",
+    "Virtual Reality", "Digitalization", "Supply Chain Management",
+    "Natural Language Processing", "Smart Grid", "Future of Work", "Smart City",
+    "Apps", "3D Technology", "CleanTech", "Security", "Manufacturing",
+    "Business Intelligence", "Collaboration", "B2B", "Logistics",
+    "Enterprise Software", "Digital Marketing", "Data Integration", "Luxury",
+    "Automation", "MarTech", "Autonomous Vehicles", "FinTech", "New Mobility",
+    "Insurance", "PropTech", "Consumer Electronics", "Internet of Things",
+    "Recruiting", "Human Resources", "Video", "RegTech", "MarkTech", "E-Commerce",
+    "Social Media", "SaaS", "Sustainability", "Circular Economy",
+    "Predictive Analytics", "Social Good (Economy)", "Education", "Electronics",
+    "Industrial Automation", "Cybersecurity", "HealthTech",
+]  # fmt: skip
+
+PARSE_QUERY_PROMPT = (
+    """
     Please extract filtering and grouping criteria from the following query. 
     Use the valid filter criteria and map any unspecified terms to the closest valid option. 
 
@@ -60,17 +75,9 @@ def parse_query(state: State, llm=LLM) -> State:
     - themes
 
     **Valid Themes:** 
-    - Analytics, Digital Transformation, Industry 4.0, Automotive, Health Care, Artificial Intelligence, 
-    Smart Home, Machine Learning, Consulting, Smart Supply Chain, Sharing Economy, Robotics, Training, 
-    Safety, Market Research, Cyber Security, InsurTech, Retail Technology, Cloud Computing, Information Services, 
-    Computer Vision, Marketing, CRM, LegalTech, Augmented Reality, Big Data, Advertising, Virtual Reality, 
-    Digitalization, Supply Chain Management, Natural Language Processing, Smart Grid, Future of Work, 
-    Smart City, Apps, 3D Technology, CleanTech, Security, Manufacturing, Business Intelligence, Collaboration, 
-    B2B, Logistics, Enterprise Software, Digital Marketing, Data Integration, Luxury, Automation, MarTech, 
-    Autonomous Vehicles, FinTech, New Mobility, Insurance, PropTech, Consumer Electronics, Internet of Things, 
-    Recruiting, Human Resources, Video, RegTech, MarkTech, InsurTech, E-Commerce, Social Media, SaaS, 
-    Sustainability, Circular Economy, Predictive Analytics, Social Good (Economy), Education, Electronics, 
-    Industrial Automation, Cybersecurity, HealthTech.
+    - """
+    + ", ".join(VALID_THEMES)
+    + """.
 
     - If the query mentions a theme not in the list, map it to the closest match.
 
@@ -93,6 +100,55 @@ def parse_query(state: State, llm=LLM) -> State:
     Do not include JSON header.
     Query: '{query}'
     """
+)
+
+QUERY_CACHE = QueryCache(model=LLM_MODEL, prompt_template=PARSE_QUERY_PROMPT)
+
+FAST_PARSER = FastParser(
+    themes=VALID_THEMES,
+    countries=CORP_STORE.column("hq_country").dictionary,
+    cities=CORP_STORE.column("hq_city").dictionary,
+)
+
+
+class State(TypedDict):
+    query: str
+    engine: str | None
+    parsed_query: dict
+    filtered_corps: List[Dict]
+    filtered_rows: np.ndarray
+    corp_store: CorpStore
+    clusters: np.ndarray
+    embeddings: np.ndarray
+    k_selection: Dict | None
+    qa_result: Dict
+    error: str | None
+
+
+def fast_parse(state: State, fast_parser=FAST_PARSER) -> State:
+    parsed_query = fast_parser.parse(state["query"])
+    if parsed_query is None:
+        return state
+    logger.info("Parsed query without the LLM")
+    return {"parsed_query": parsed_query, **state}
+
+
+def route_query(state: State) -> str:
+    """
+    Skips the LLM when the fast parser already produced parsed_query.
+    """
+    return "fetch_data" if state.get("parsed_query") else "parse_query"
+
+
+def parse_query(state: State, llm=LLM, query_cache=QUERY_CACHE) -> State:
+    query = state["query"]
+
+    cached = query_cache.get(query)
+    if cached is not None:
+        logger.info("Parsed query served from cache")
+        return {"parsed_query": cached, **state}
+
+    content = PARSE_QUERY_PROMPT.format(query=query)
 
     prompt = [{"role": "user", "content": content}]
     response = llm.invoke(prompt)
@@ -105,117 +161,108 @@ def parse_query(state: State, llm=LLM) -> State:
     }
 
     parsed_query = {k: v for k, v in parsed_query.items() if v is not None}
+    query_cache.put(query, parsed_query)
     return {"parsed_query": parsed_query, **state}
 
 
-def fetch_data(state: State, corp_data=CORP_DATA["corps"]) -> State:
+def fetch_data(state: State, corp_index=CORP_INDEX, filter_cache=FILTER_CACHE) -> State:
+    index = corp_index.get()
+    if index.store.version != filter_cache.version:
+        logger.info(f"Using corpus store version {index.store.version[:12]}")
+
     filter_criteria = state["parsed_query"]["filter"]
     print(filter_criteria)
-    filtered_corps = []
-    for corp in corp_data:
-        add_other = True
-        add_theme = False
-        for key, value in filter_criteria.items():
-            if key == "themes":
-                for theme in value:
-                    if theme in corp["themes"]:
-                        add_theme = True
-                        break
-            else:
-                corp_value = str(corp.get(key, "")).lower()
-                if corp_value.find(value.lower()) == -1:
-                    add_other = False
-        if "themes" in filter_criteria.keys():
-            if add_other and add_theme:
-                filtered_corps.append(corp)
-        else:
-            if add_other:
-                filtered_corps.append(corp)
-
-    if not filtered_corps:
+    filtered_rows = filter_cache.lookup(
+        index.store.version, filter_criteria, index.filter
+    )
+    logger.info(f"Filter cache: {filter_cache.stats()}")
+
+    if not len(filtered_rows):
         logger.warning("No companies matcher the filter criteria")
         return {"error": "No matching companies found", **state}
+    filtered_corps = index.store.rows(filtered_rows)
     print(filtered_corps)
-    return {"filtered_corps": filtered_corps, **state}
-
-
-def cluster(state: State, embedding=EMBEDDING, n_clusters=2) -> State:
-    corps = state["filtered_corps"]
-    group_by = state["parsed_query"]["group_by"]
-
-    if group_by == "themes":
-        text_data = [
-            " ".join(
-                [
-                    (theme[0] + " ") * int(theme[1])
-                    for theme in corporate["startup_themes"]
-                    if theme[0] != "Other"
-                ]
-            )
-            for corporate in corps
-        ]
-    elif group_by == "geography":
-        text_data = [
-            " ".join([corporate.get("hq_city"), corporate.get("hq_country")])
-            for corporate in corps
-        ]
-
-    else:
-        text_data = [
-            " ".join(
-                [
-                    corporate["name"],
-                    corporate["description"],
-                    " ".join(
-                        [
-                            (theme[0] + " ") * int(theme[1])
-                            for theme in corporate["startup_themes"]
-                            if theme[0] != "Other"
-                        ]
-                    ),
-                ]
-            )
-            for corporate in corps
-        ]
-
-    text_data_processed = []
-
-    for data in text_data:
-        text_data_processed.append(data.lower().split())
-
-    embeddings = [embedding.embed_query(text)[50:] for text in text_data]
-    X = np.array(embeddings)
+    return {
+        "filtered_corps": filtered_corps,
+        "filtered_rows": filtered_rows,
+        "corp_store": index.store,
+        **state,
+    }
 
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    clusters = kmeans.fit_predict(X)
 
-    return {"clusters": clusters, "embeddings": X, **state}
+def cluster(
+    state: State,
+    provider=EMBEDDER,
+    n_clusters=N_CLUSTERS,
+    engine=CLUSTER_ENGINE,
+    centroid_cache=CENTROID_CACHE,
+) -> State:
+    """
+    Clusters the filtered corporates on their view's vectors, sliced
+    from the precomputed corpus matrix of the store they were filtered
+    from, or computed on demand when the store has none. Geography is
+    clustered on headquarters coordinates when the store has them.
+
+    The engine (see clustering.ENGINES) comes from the state when the
+    query sets one. With n_clusters "auto", KMeans engines choose the
+    cluster count with a k sweep. Otherwise they warm start from the
+    centroids of an earlier, overlapping result, when the vectors do not
+    depend on which corporates were filtered.
+    """
+    view = view_name(state["parsed_query"]["group_by"])
+    rows, corp_store = state["filtered_rows"], state["corp_store"]
+
+    matrix = corp_store.embeddings(provider.name, view)
+    coordinates = corp_store.coordinates(rows) if view == "geography" else None
+    if coordinates is not None:
+        X = unit_vectors(*coordinates)
+    elif matrix is not None:
+        X = np.asarray(matrix[rows])
+    else:
+        X = provider.embed_view(view, state["filtered_corps"])
+
+    engine = state.get("engine") or engine
+    warm = None
+    if coordinates is not None or matrix is not None or provider.stable(view):
+        key = (corp_store.version, provider.name, view, engine, n_clusters)
+        warm = (centroid_cache, key, rows)
+
+    clusters, k_selection = run_engine(engine, X, n_clusters, warm)
+    logger.info(f"Centroid cache: {centroid_cache.stats()}")
+    if k_selection is not None:
+        logger.info(f"Chose {k_selection['k']} clusters: {k_selection['scores']}")
+
+    return {
+        "clusters": clusters,
+        "embeddings": X,
+        "k_selection": k_selection,
+        **state,
+    }
 
 
 def quality_assurance(state: State) -> State:
-    embeddings = state["embeddings"]
-    clusters = state["clusters"]
-    silhouette_avg = silhouette_score(embeddings, clusters)
-    calinski_harabasz = calinski_harabasz_score(embeddings, clusters)
-    davies_bouldin = davies_bouldin_score(embeddings, clusters)
-
-    results = {}
-    results["silhouette"] = silhouette_avg
-    results["calinski-harabasz"] = calinski_harabasz
-    results["davies-bouldin"] = davies_bouldin
-
+    """
+    Scores the clusters in one pass and decides a pass/warn verdict.
+    """
+    results = evaluate(state["embeddings"], state["clusters"])
+    if results["verdict"] != "pass":
+        logger.warning(f"Cluster QA: {'; '.join(results['reasons'])}")
     return {"qa_result": results, **state}
 
 
 def create_graph() -> StateGraph:
     graph = StateGraph(State)
 
+    graph.add_node("fast_parse", fast_parse)
     graph.add_node("parse_query", parse_query)
     graph.add_node("fetch_data", fetch_data)
     graph.add_node("cluster", cluster)
     graph.add_node("quality_assurance", quality_assurance)
 
-    graph.add_edge(START, "parse_query")
+    graph.add_edge(START, "fast_parse")
+    graph.add_conditional_edges(
+        "fast_parse", route_query, ["parse_query", "fetch_data"]
+    )
     graph.add_edge("parse_query", "fetch_data")
     graph.add_edge("fetch_data", "cluster")
     graph.add_edge("cluster", "quality_assurance")
@@ -224,10 +271,10 @@ def create_graph() -> StateGraph:
     return graph.compile()
 
 
-def run_workflow(query: str) -> Dict:
+def run_workflow(query: str, engine: str | None = None) -> Dict:
     try:
         graph = create_graph()
-        initial_state = {"query": query, "error": None}
+        initial_state = {"query": query, "engine": engine, "error": None}
         result = graph.invoke(initial_state)
 
         if result.get("error"):
@@ -237,8 +284,10 @@ def run_workflow(query: str) -> Dict:
         return {
             "status": "success",
             "filtered_companies": len(result["filtered_corps"]),
-            "clusters": len(np.unique(result["clusters"])),
+            # Density engines label noise -1, which is not a cluster.
+            "clusters": len(set(np.unique(result["clusters"])) - {-1}),
             "quality_metrics": result["qa_result"],
+            "k_selection": result.get("k_selection"),
         }
 
     except Exception as e:
@@ -0,0 +1,140 @@
+"""
+Builds the bundled gazetteer.json from GeoNames data.
+
+Needs the geonamescache package (pip install geonamescache), only to
+rebuild the file, e.g. when the corpus gains cities the gazetteer lacks.
+Preprocessing only reads gazetteer.json.
+"""
+
+import json
+import logging
+import numpy as np
+import geonamescache
+from corp_store import CorpStore, STORE_PATH
+from gazetteer import GAZETTEER_PATH, fold, unit_vectors
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cities above this population are always included, smaller ones only
+# when the corpus has them.
+MIN_POPULATION = 15000
+
+COUNTRY_ALIASES = {
+    "CZ": ["Czech Republic"],
+    "GB": ["UK", "Great Britain", "England", "Scotland", "Wales"],
+    "KR": ["Korea", "Republic of Korea"],
+    "NL": ["Netherlands", "Holland"],
+    "US": ["USA", "United States of America"],
+}
+
+
+def centroid(lat, lon, weights):
+    """
+    Weighted mean position on the sphere.
+    """
+    x, y, z = np.average(unit_vectors(lat, lon), axis=0, weights=weights)
+    return [
+        round(float(np.degrees(np.arctan2(z, np.hypot(x, y)))), 4),
+        round(float(np.degrees(np.arctan2(y, x))), 4),
+    ]
+
+
+def write_gazetteer(gazetteer, path=GAZETTEER_PATH):
+    """
+    Writes the gazetteer as indented JSON with sorted keys and one city
+    or country field per line, so a rebuild diffs line by line.
+    """
+
+    def lines(mapping, depth):
+        pad = " " * depth
+        for i, (key, value) in enumerate(sorted(mapping.items())):
+            end = "," if i < len(mapping) - 1 else ""
+            if depth < 3:
+                yield f"{pad}{json.dumps(key)}: {{"
+                yield from lines(value, depth + 1)
+                yield f"{pad}}}{end}"
+            else:
+                yield f"{pad}{json.dumps(key)}: {json.dumps(value, sort_keys=True)}{end}"
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{\n")
+        for line in lines(gazetteer, 1):
+            f.write(line + "\n")
+        f.write("}\n")
+
+
+def build(store_path=STORE_PATH, path=GAZETTEER_PATH):
+    geonames = geonamescache.GeonamesCache(min_city_population=500)
+    countries = geonames.get_countries()
+
+    by_country = {}
+    for city in geonames.get_cities().values():
+        by_country.setdefault(city["countrycode"], []).append(city)
+
+    store = CorpStore(store_path)
+    wanted = {}
+    for i in range(len(store)):
+        city, country = store.column("hq_city")[i], store.column("hq_country")[i]
+        if city and country:
+            wanted.setdefault(fold(country), set()).add(fold(city))
+
+    gazetteer = {"countries": {}, "cities": {}}
+    for code, country in countries.items():
+        names = [country["name"]] + COUNTRY_ALIASES.get(code, [])
+        places = by_country.get(code, [])
+        if not places:
+            continue
+
+        large = [place for place in places if place["population"] >= MIN_POPULATION]
+        sample = large or places
+        gazetteer["countries"][code] = {
+            "names": names,
+            "coordinates": centroid(
+                [place["latitude"] for place in sample],
+                [place["longitude"] for place in sample],
+                [max(place["population"], 1) for place in sample],
+            ),
+        }
+
+        corpus_cities = set()
+        for name in names:
+            corpus_cities |= wanted.get(fold(name), set())
+
+        # The most populous place wins a name, alternate names
+        # only count for corpus cities.
+        cities = {}
+        for place in sorted(places, key=lambda place: place["population"]):
+            coordinates = [
+                round(place["latitude"], 4),
+                round(place["longitude"], 4),
+            ]
+            for name in {place["name"], *place["alternatenames"]}:
+                folded = fold(name)
+                if folded in corpus_cities or (
+                    name == place["name"] and place["population"] >= MIN_POPULATION
+                ):
+                    cities[folded] = coordinates
+        gazetteer["cities"][code] = dict(sorted(cities.items()))
+
+    write_gazetteer(gazetteer, path)
+
+    missing = [
+        (city, country)
+        for country, cities in wanted.items()
+        for city in cities
+        if not any(
+            city in gazetteer["cities"].get(code, {})
+            for code, entry in gazetteer["countries"].items()
+            if country in map(fold, entry["names"])
+        )
+    ]
+    logger.info(
+        f"Wrote {len(gazetteer['countries'])} countries and "
+        f"{sum(map(len, gazetteer['cities'].values()))} cities, "
+        f"{len(missing)} corpus cities fall back to their country"
+    )
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,352 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+from sklearn.cluster import DBSCAN, HDBSCAN, KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.neighbors import NearestNeighbors
+from threadpoolctl import threadpool_limits
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+# Clustering engine, see ENGINES.
+CLUSTER_ENGINE = os.getenv("CLUSTER_ENGINE", "kmeans")
+
+# Cluster count, an integer or "auto" for a k sweep.
+N_CLUSTERS = os.getenv("N_CLUSTERS", "2")
+
+AUTO_K_MIN = int(os.getenv("AUTO_K_MIN", 2))
+AUTO_K_MAX = int(os.getenv("AUTO_K_MAX", 12))
+# Candidates in a row without a better score before the sweep stops.
+AUTO_K_PATIENCE = int(os.getenv("AUTO_K_PATIENCE", 3))
+# Points the silhouette is estimated on, for larger inputs.
+SILHOUETTE_SAMPLE = int(os.getenv("SILHOUETTE_SAMPLE", 1000))
+
+RANDOM_STATE = 42
+
+# Density engines: neighbours a core point needs, and the percentile of
+# k-distances taken as DBSCAN's eps.
+MIN_SAMPLES = int(os.getenv("MIN_SAMPLES", 5))
+EPS_PERCENTILE = float(os.getenv("EPS_PERCENTILE", 90))
+# Lower bound on eps, for when most points share their position.
+MIN_EPS = 1e-6
+# Added to stored graph distances so zero distances stay stored edges.
+EDGE_OFFSET = 1e-12
+# Neighbours kept per point in the approximate neighbour graph.
+GRAPH_NEIGHBORS = int(os.getenv("GRAPH_NEIGHBORS", 30))
+# Below this many points, exact neighbour search is faster than an index.
+# The crawled corpus is far smaller, so the index path stays dormant
+# unless this is lowered or the corpus grows.
+ANN_MIN_POINTS = int(os.getenv("ANN_MIN_POINTS", 20000))
+
+CENTROID_CACHE_SIZE = int(os.getenv("CENTROID_CACHE_SIZE", 64))
+# Share of a filter result's rows an earlier result must have clustered
+# for its centroids to be reused.
+WARM_START_OVERLAP = float(os.getenv("WARM_START_OVERLAP", 0.5))
+
+
+def minibatch_kmeans(k):
+    return MiniBatchKMeans(
+        n_clusters=k, random_state=RANDOM_STATE, n_init=3, batch_size=1024
+    )
+
+
+def fit_k(X, k, sample_size=SILHOUETTE_SAMPLE):
+    """
+    Fits MiniBatchKMeans with k clusters. Returns (labels, silhouette),
+    the silhouette sampled above sample_size points.
+    """
+    labels = minibatch_kmeans(k).fit_predict(X)
+    if len(np.unique(labels)) < 2:
+        return labels, -1.0
+
+    sample = sample_size if X.shape[0] > sample_size else None
+    score = silhouette_score(X, labels, sample_size=sample, random_state=RANDOM_STATE)
+    return labels, float(score)
+
+
+def select_k(
+    X,
+    k_min=AUTO_K_MIN,
+    k_max=AUTO_K_MAX,
+    patience=AUTO_K_PATIENCE,
+    sample_size=SILHOUETTE_SAMPLE,
+    workers=None,
+):
+    """
+    Sweeps k from k_min up, fitting one wave of candidates in parallel,
+    one single-threaded fit per core, and stops once patience candidates
+    in a row score no better than the best so far.
+
+    Returns (labels, {"k": chosen k, "scores": {k: silhouette}}).
+    """
+    n = X.shape[0]
+    k_max = min(k_max, n - 1)
+    if k_max < k_min:
+        return np.zeros(n, dtype=np.int32), {"k": 1, "scores": {}}
+
+    workers = workers or os.cpu_count() or 1
+    best_k, best_labels, best_score = None, None, -np.inf
+    scores, stale = {}, 0
+
+    # Each fit would start its own OpenMP and BLAS threads. The limit is
+    # process-wide, so it is set once around the whole sweep.
+    inner = max(1, (os.cpu_count() or 1) // workers)
+    with threadpool_limits(limits=inner), ThreadPoolExecutor(workers) as pool:
+        for start in range(k_min, k_max + 1, workers):
+            ks = list(range(start, min(start + workers, k_max + 1)))
+            fits = pool.map(lambda k: fit_k(X, k, sample_size), ks)
+
+            for k, (labels, score) in zip(ks, fits):
+                scores[k] = score
+                if score > best_score:
+                    best_k, best_labels, best_score = k, labels, score
+                    stale = 0
+                else:
+                    stale += 1
+
+            if stale >= patience:
+                break
+
+    return best_labels, {"k": best_k, "scores": scores}
+
+
+def knn_graph(X, n_neighbors):
+    """
+    Returns (distances, indices) of every point's n_neighbors nearest
+    points, the point itself included.
+
+    Uses an approximate HNSW index (hnswlib) for large dense inputs when
+    it is installed, exact sklearn NearestNeighbors otherwise.
+    """
+    n = X.shape[0]
+    n_neighbors = min(n_neighbors, n)
+    if hnswlib is None or sparse.issparse(X) or n < ANN_MIN_POINTS:
+        return NearestNeighbors(n_neighbors=n_neighbors).fit(X).kneighbors(X)
+
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    index = hnswlib.Index(space="l2", dim=X.shape[1])
+    index.init_index(
+        max_elements=n, ef_construction=200, M=16, random_seed=RANDOM_STATE
+    )
+    index.add_items(X)
+    index.set_ef(max(2 * n_neighbors, 50))
+    indices, squared = index.knn_query(X, k=n_neighbors)
+    return np.sqrt(np.maximum(squared, 0)), indices.astype(np.int64)
+
+
+def estimate_eps(distances, min_samples, percentile=EPS_PERCENTILE):
+    """
+    DBSCAN eps from the k-distance distribution: the given percentile
+    of every point's distance to its min_samples-th neighbour, at least
+    MIN_EPS.
+    """
+    eps = float(np.percentile(distances[:, min_samples - 1], percentile))
+    return max(eps, MIN_EPS)
+
+
+def radius_graph(distances, indices, radius=None):
+    """
+    Sparse, symmetric distance matrix of the neighbour graph, keeping
+    edges up to radius. Pairs missing from it count as far apart.
+    """
+    n = len(indices)
+    rows = np.repeat(np.arange(n), indices.shape[1])
+    columns, values = indices.ravel(), distances.ravel().astype(np.float64)
+    if radius is not None:
+        keep = values <= radius
+        rows, columns, values = rows[keep], columns[keep], values[keep]
+
+    # Offset so zero distances (the point itself, duplicate points)
+    # stay stored edges instead of being dropped as sparse zeros. Callers
+    # comparing against radius add EDGE_OFFSET to it too.
+    graph = sparse.csr_matrix((values + EDGE_OFFSET, (rows, columns)), shape=(n, n))
+    return graph.maximum(graph.T)
+
+
+class CentroidCache:
+    """
+    LRU cache of fitted KMeans models, one per key, e.g.
+    (store version, provider, view, engine, k).
+
+    When most rows of a filter result were clustered under the same key
+    before, KMeans starts from the cached centroids instead of k-means++,
+    and MiniBatchKMeans only runs partial_fit over the rows it has not
+    seen yet.
+    """
+
+    def __init__(self, max_entries=CENTROID_CACHE_SIZE, overlap=WARM_START_OVERLAP):
+        self.max_entries = max_entries
+        self.overlap = overlap
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, rows):
+        """
+        Returns (model, seen rows) cached for key if enough of rows
+        were seen, else None.
+        """
+        entry = self.entries.get(key)
+        if entry is None or np.isin(rows, entry[1]).mean() < self.overlap:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def store(self, key, model, rows):
+        self.entries[key] = (model, rows)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def fit(self, key, rows, X, engine, k):
+        """
+        Fits engine ("kmeans" or "minibatch") with k clusters on X,
+        whose rows are the given corpus rows. Returns the labels.
+        """
+        entry = self.lookup(key, rows)
+        if entry is None:
+            model = KMeans(n_clusters=k, random_state=RANDOM_STATE)
+            if engine == "minibatch":
+                model = minibatch_kmeans(k)
+            labels = model.fit_predict(X)
+            self.store(key, model, rows)
+            return labels
+
+        model, seen = entry
+        if engine == "minibatch":
+            new = ~np.isin(rows, seen)
+            if new.any():
+                model.partial_fit(X[new])
+            self.store(key, model, np.union1d(seen, rows))
+            return model.predict(X)
+
+        model = KMeans(
+            n_clusters=k,
+            init=model.cluster_centers_,
+            n_init=1,
+            random_state=RANDOM_STATE,
+        )
+        labels = model.fit_predict(X)
+        self.store(key, model, rows)
+        return labels
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+
+def cluster_kmeans(X, n_clusters, warm=None):
+    if n_clusters == "auto":
+        return select_k(X)
+    if warm is not None:
+        cache, key, rows = warm
+        return cache.fit(key, rows, X, "kmeans", int(n_clusters)), None
+    kmeans = KMeans(n_clusters=int(n_clusters), random_state=RANDOM_STATE)
+    return kmeans.fit_predict(X), None
+
+
+def cluster_minibatch(X, n_clusters, warm=None):
+    if n_clusters == "auto":
+        return select_k(X)
+    if warm is not None:
+        cache, key, rows = warm
+        return cache.fit(key, rows, X, "minibatch", int(n_clusters)), None
+    return minibatch_kmeans(int(n_clusters)).fit_predict(X), None
+
+
+def cluster_dbscan(X, n_clusters=None, warm=None):
+    """
+    DBSCAN over the neighbour graph, with eps estimated from it,
+    instead of an all-pairs neighbour search.
+    """
+    min_samples = min(MIN_SAMPLES, X.shape[0])
+    distances, indices = knn_graph(X, max(GRAPH_NEIGHBORS, min_samples))
+    eps = estimate_eps(distances, min_samples)
+    logger.info(f"DBSCAN eps {eps:.4g}")
+
+    graph = radius_graph(distances, indices, eps)
+    dbscan = DBSCAN(
+        eps=eps + EDGE_OFFSET, min_samples=min_samples, metric="precomputed"
+    )
+    labels = dbscan.fit_predict(graph)
+    return labels, None
+
+
+def connect_components(graph):
+    """
+    Chains the neighbour graph's connected components together with
+    edges longer than any in the graph, so HDBSCAN (which needs one
+    component) only merges them at the top of its hierarchy.
+    """
+    n_components, labels = csgraph.connected_components(graph, directed=False)
+    if n_components == 1:
+        return graph
+
+    representatives = np.unique(labels, return_index=True)[1]
+    far = 2 * graph.data.max() + 1
+    bridges = sparse.csr_matrix(
+        (
+            np.full(n_components - 1, far),
+            (representatives[:-1], representatives[1:]),
+        ),
+        shape=graph.shape,
+    )
+    return graph.maximum(bridges).maximum(bridges.T)
+
+
+def cluster_hdbscan(X, n_clusters=None, warm=None):
+    """
+    HDBSCAN over the neighbour graph instead of all pairwise distances.
+    """
+    n = X.shape[0]
+    if n < 2:
+        return np.zeros(n, dtype=np.int64), None
+
+    min_samples = min(MIN_SAMPLES, n)
+    distances, indices = knn_graph(X, max(GRAPH_NEIGHBORS, min_samples))
+    graph = connect_components(radius_graph(distances, indices))
+    hdbscan = HDBSCAN(
+        min_cluster_size=max(min_samples, 2),
+        min_samples=min_samples,
+        metric="precomputed",
+        copy=False,
+    )
+    return hdbscan.fit_predict(graph), None
+
+
+# Engines take (X, n_clusters, warm) and return (labels, k_selection).
+# warm is (CentroidCache, key, rows) to warm start KMeans engines from.
+# Density engines ignore n_clusters and warm, and label noise -1. On the
+# crawled corpus they often degenerate: HDBSCAN labels every row of the
+# themes view of a query like "AI" noise, and DBSCAN finds one cluster.
+# run_engine logs a warning then; kmeans is the engine to use for such
+# queries.
+ENGINES = {
+    "kmeans": cluster_kmeans,
+    "minibatch": cluster_minibatch,
+    "dbscan": cluster_dbscan,
+    "hdbscan": cluster_hdbscan,
+}
+
+
+def run_engine(name, X, n_clusters, warm=None):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown clustering engine: {name}")
+    labels, k_selection = ENGINES[name](X, n_clusters, warm)
+    found = len(set(np.unique(labels)) - {-1})
+    if name in ("dbscan", "hdbscan") and found <= 1 and len(labels) > 1:
+        logger.warning(
+            f"{name} found {found} cluster(s) in {len(labels)} rows, "
+            f"{int(np.sum(labels == -1))} labelled noise"
+        )
+    return labels, k_selection
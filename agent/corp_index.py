@@ -0,0 +1,194 @@
+import numpy as np
+from corp_store import CorpStore, STORE_PATH, STRING_COLUMNS, NULL, read_meta
+
+
+def group_rows(keys, rows, n_keys):
+    """
+    Builds posting lists: for each key in range(n_keys), the sorted
+    rows it appears in. keys and rows are parallel arrays.
+    """
+    order = np.argsort(keys, kind="stable")
+    keys, rows = keys[order], rows[order]
+    bounds = np.searchsorted(keys, np.arange(n_keys + 1))
+    return [rows[bounds[k] : bounds[k + 1]] for k in range(n_keys)]
+
+
+def union(postings):
+    if not postings:
+        return np.empty(0, dtype=np.int64)
+    if len(postings) == 1:
+        return postings[0]
+    return np.unique(np.concatenate(postings))
+
+
+class TrigramIndex:
+    """
+    Trigram index over lowercased strings.
+
+    A substring of three or more characters can only occur in strings
+    holding all of its trigrams, so candidates are the intersection of
+    those trigrams' posting lists and only candidates are verified.
+    """
+
+    N = 3
+
+    def __init__(self, strings):
+        self.strings = strings
+        grams = {}
+        for code, text in enumerate(strings):
+            for gram in {text[i : i + self.N] for i in range(len(text) - self.N + 1)}:
+                grams.setdefault(gram, []).append(code)
+        self.grams = {
+            gram: np.array(codes, dtype=np.int64) for gram, codes in grams.items()
+        }
+
+    def candidates(self, value):
+        grams = {value[i : i + self.N] for i in range(len(value) - self.N + 1)}
+        postings = []
+        for gram in grams:
+            if gram not in self.grams:
+                return np.empty(0, dtype=np.int64)
+            postings.append(self.grams[gram])
+
+        postings.sort(key=len)
+        codes = postings[0]
+        for posting in postings[1:]:
+            codes = np.intersect1d(codes, posting, assume_unique=True)
+            if not len(codes):
+                break
+        return codes
+
+    def search(self, value):
+        """
+        Returns the codes of strings containing value.
+        Shorter values than a trigram fall back to a scan.
+        """
+        if len(value) < self.N:
+            return [code for code, text in enumerate(self.strings) if value in text]
+        return [code for code in self.candidates(value) if value in self.strings[code]]
+
+
+class ColumnIndex:
+    """
+    Posting lists over a dictionary-encoded string column.
+
+    A substring filter is matched against the column's dictionary,
+    pre-lowercased once, and answered as the union of the matching
+    entries' posting lists. With ngrams, dictionary entries are found
+    through a trigram index instead of a dictionary scan.
+    """
+
+    def __init__(self, column, ngrams=False):
+        dictionary = column.dictionary
+        self.lowered = [value.lower() for value in dictionary]
+        self.trigrams = TrigramIndex(self.lowered) if ngrams else None
+
+        codes = np.asarray(column.codes)
+        rows = np.arange(len(codes), dtype=np.int64)
+        valid = codes != NULL
+        self.postings = group_rows(codes[valid], rows[valid], len(dictionary))
+
+    def codes_containing(self, value):
+        if self.trigrams is not None:
+            return self.trigrams.search(value)
+        return [code for code, entry in enumerate(self.lowered) if value in entry]
+
+    def rows_containing(self, value):
+        return union([self.postings[code] for code in self.codes_containing(value)])
+
+
+class CorpIndex:
+    """
+    Inverted indexes over a CorpStore, built once at load.
+
+    Theme filters are answered from per-theme posting lists, string filters
+    from per-column dictionary posting lists (through trigram indexes for
+    name and description), and the criteria are combined by intersection
+    instead of scanning every corporate.
+    """
+
+    def __init__(
+        self,
+        store: CorpStore,
+        indexed=("hq_country", "hq_city"),
+        ngram_indexed=("name", "description"),
+    ):
+        self.store = store
+        self.all_rows = np.arange(len(store), dtype=np.int64)
+
+        offsets = np.asarray(store.array("themes.offsets"))
+        theme_rows = np.repeat(self.all_rows, np.diff(offsets))
+        theme_ids = np.asarray(store.array("themes.values"))
+        self.theme_postings = dict(
+            zip(store.themes, group_rows(theme_ids, theme_rows, len(store.themes)))
+        )
+
+        self.columns = {}
+        for name in indexed:
+            self.column_index(name)
+        for name in ngram_indexed:
+            self.columns[name] = ColumnIndex(store.column(name), ngrams=True)
+
+    def column_index(self, name):
+        """
+        Returns the column's index, building it on first use
+        for columns that are not indexed at load.
+        """
+        if name not in self.columns:
+            self.columns[name] = ColumnIndex(self.store.column(name))
+        return self.columns[name]
+
+    def rows_with_themes(self, themes):
+        return union(
+            [
+                self.theme_postings[theme]
+                for theme in themes
+                if theme in self.theme_postings
+            ]
+        )
+
+    def rows_containing(self, key, value):
+        value = value.lower()
+        if not value:
+            return self.all_rows
+        if key not in STRING_COLUMNS:
+            return np.empty(0, dtype=np.int64)
+        return self.column_index(key).rows_containing(value)
+
+    def filter(self, filter_criteria: dict) -> np.ndarray:
+        """
+        Returns the sorted rows matching every criterion.
+
+        "themes" matches corporates with any of the listed themes,
+        other keys match corporates whose field contains the value,
+        case-insensitively.
+        """
+        rows = self.all_rows
+        for key, value in filter_criteria.items():
+            if key == "themes":
+                matched = self.rows_with_themes(value)
+            else:
+                matched = self.rows_containing(key, value)
+
+            rows = np.intersect1d(rows, matched, assume_unique=True)
+            if not len(rows):
+                break
+
+        return rows
+
+
+class CurrentIndex:
+    """
+    The CorpIndex of the store's current version. get() reopens and
+    reindexes the store once preprocessing has swapped in a new version.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.index = CorpIndex(CorpStore(path))
+
+    def get(self) -> CorpIndex:
+        meta = read_meta(self.path)
+        if meta is not None and meta["version"] != self.index.store.version:
+            self.index = CorpIndex(CorpStore(self.path))
+        return self.index
@@ -0,0 +1,367 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+STORE_PATH = "corp_store"
+
+STRING_COLUMNS = [
+    "id",
+    "name",
+    "description",
+    "logo_url",
+    "hq_city",
+    "hq_country",
+    "website_url",
+    "linkedin_url",
+    "twitter_url",
+    "startup_friendly_badge",
+    "__typename",
+]
+
+INT_COLUMNS = ["startup_partners_count"]
+
+RECORD_FIELDS = [
+    "id",
+    "name",
+    "description",
+    "logo_url",
+    "hq_city",
+    "hq_country",
+    "website_url",
+    "linkedin_url",
+    "twitter_url",
+    "startup_partners_count",
+    "startup_partners",
+    "startup_themes",
+    "startup_friendly_badge",
+    "__typename",
+    "themes",
+]
+
+PARTNER_COLUMNS = [
+    "master_startup_id",
+    "company_name",
+    "logo_url",
+    "city",
+    "website",
+    "country",
+    "theme_gd",
+    "__typename",
+]
+
+NULL = -1
+
+
+def encode_strings(values):
+    """
+    Dictionary-encodes a list of strings (or None).
+
+    Returns (codes, blob, offsets): int32 codes into the dictionary,
+    NULL for None, and the dictionary as one utf-8 blob with int64
+    offsets, so it can be memory-mapped as plain arrays.
+    """
+    lookup = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = NULL
+        else:
+            codes[i] = lookup.setdefault(value, len(lookup))
+
+    encoded = [value.encode("utf-8") for value in lookup]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return codes, blob, offsets
+
+
+def encode_lists(lists):
+    """
+    Flattens a list of lists into (values, offsets).
+    Row i is values[offsets[i]:offsets[i + 1]].
+    """
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(items) for items in lists])
+    values = [item for items in lists for item in items]
+    return values, offsets
+
+
+def store_arrays(corps):
+    """
+    Builds the store's columns as {file name: array}.
+    """
+    arrays = {}
+
+    def add_strings(name, values):
+        codes, blob, offsets = encode_strings(values)
+        arrays[f"{name}.codes"] = codes
+        arrays[f"{name}.dict"] = blob
+        arrays[f"{name}.dict_offsets"] = offsets
+
+    for column in STRING_COLUMNS:
+        add_strings(column, [corp.get(column) for corp in corps])
+
+    for column in INT_COLUMNS:
+        values = [corp.get(column) for corp in corps]
+        arrays[column] = np.array(
+            [NULL if value is None else value for value in values], dtype=np.int64
+        )
+
+    # One theme dictionary for both themes and startup_themes.
+    themes, theme_offsets = encode_lists([corp["themes"] for corp in corps])
+    startup_themes, startup_offsets = encode_lists(
+        [corp["startup_themes"] for corp in corps]
+    )
+    codes, blob, offsets = encode_strings(
+        themes + [theme[0] for theme in startup_themes]
+    )
+    arrays["theme.dict"] = blob
+    arrays["theme.dict_offsets"] = offsets
+    arrays["themes.values"] = codes[: len(themes)]
+    arrays["themes.offsets"] = theme_offsets
+    arrays["startup_themes.values"] = codes[len(themes) :]
+    arrays["startup_themes.counts"] = np.array(
+        [int(theme[1]) for theme in startup_themes], dtype=np.int32
+    )
+    arrays["startup_themes.offsets"] = startup_offsets
+
+    partners, partner_offsets = encode_lists(
+        [corp["startup_partners"] for corp in corps]
+    )
+    arrays["startup_partners.offsets"] = partner_offsets
+    for column in PARTNER_COLUMNS:
+        add_strings(f"partner.{column}", [partner.get(column) for partner in partners])
+
+    return arrays
+
+
+def array_hash(name, array):
+    digest = hashlib.sha256(name.encode("utf-8"))
+    digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def read_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_store(corps, path=STORE_PATH, extra=None, skipped=()):
+    """
+    Writes corporates as a columnar store directory, with any extra
+    row-aligned arrays (e.g. view embeddings) stored next to the columns.
+    skipped names extra arrays that could not be computed, recorded in
+    meta.json.
+
+    Only columns whose content changed are written again, unchanged ones
+    are hard-linked from the current store. The new store is assembled
+    next to the old one and swapped in. CorpStore maps every file when
+    it opens, so open stores keep reading the old files.
+    """
+    arrays = store_arrays(corps)
+    arrays.update(extra or {})
+    hashes = {name: array_hash(name, array) for name, array in arrays.items()}
+
+    version = hashlib.sha256()
+    for name in sorted(hashes):
+        version.update(hashes[name].encode("utf-8"))
+
+    old_meta = read_meta(path) or {}
+    old_hashes = old_meta.get("columns", {})
+
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    written = []
+    for name, array in arrays.items():
+        filename = f"{name}.npy"
+        if old_hashes.get(name) == hashes[name]:
+            try:
+                os.link(os.path.join(path, filename), os.path.join(tmp_path, filename))
+                continue
+            except OSError:
+                pass
+        np.save(os.path.join(tmp_path, filename), array)
+        written.append(name)
+
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(
+            {
+                "version": version.hexdigest(),
+                "rows": len(corps),
+                "columns": hashes,
+                "skipped": sorted(skipped),
+            },
+            f,
+        )
+
+    old_path = path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    return written
+
+
+class StringColumn:
+    """
+    A memory-mapped dictionary-encoded string column.
+    """
+
+    def __init__(self, codes, blob, offsets):
+        self.codes = codes
+        self.blob = blob
+        self.offsets = offsets
+        self._dictionary = None
+
+    @property
+    def dictionary(self):
+        """
+        The decoded dictionary, decoded once on first use.
+        """
+        if self._dictionary is None:
+            data = self.blob.tobytes()
+            self._dictionary = [
+                data[start:end].decode("utf-8")
+                for start, end in zip(self.offsets[:-1], self.offsets[1:])
+            ]
+        return self._dictionary
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        return None if code == NULL else self.dictionary[code]
+
+
+class CorpStore:
+    """
+    Read-only view over a columnar store written by write_store.
+
+    Arrays are memory-mapped, records are only materialized
+    as dicts for the rows that are asked for.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self.meta, self._arrays = self._open()
+        self.version = self.meta["version"]
+        self._columns = {}
+
+    def _open(self):
+        """
+        Maps every array of one store version. Arrays mapped lazily could
+        come from a store swapped in later, with different row numbers.
+        Retries when write_store swaps the store while it is being opened.
+        """
+        while True:
+            meta = read_meta(self.path)
+            if meta is None:
+                raise FileNotFoundError(f"No corpus store at {self.path}")
+            try:
+                arrays = {
+                    name: np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+                    for name in meta["columns"]
+                }
+            except FileNotFoundError:
+                continue
+            current = read_meta(self.path)
+            if current is not None and current["version"] == meta["version"]:
+                return meta, arrays
+
+    def array(self, name):
+        return self._arrays[name]
+
+    def embeddings(self, provider, view):
+        """
+        Returns the view's precomputed embedding matrix from provider,
+        or None if the store was written without it.
+        """
+        name = f"embedding.{provider}.{view}"
+        if name not in self.meta["columns"]:
+            return None
+        return self.array(name)
+
+    def coordinates(self, indices):
+        """
+        Returns the (lat, lon) arrays of the rows' headquarters,
+        or None if the store was written without them.
+        """
+        if "geo.lat" not in self.meta["columns"]:
+            return None
+        return self.array("geo.lat")[indices], self.array("geo.lon")[indices]
+
+    def column(self, name):
+        """
+        Returns a StringColumn, e.g. "name" or "partner.city".
+        """
+        if name not in self._columns:
+            self._columns[name] = StringColumn(
+                self.array(f"{name}.codes"),
+                self.array(f"{name}.dict"),
+                self.array(f"{name}.dict_offsets"),
+            )
+        return self._columns[name]
+
+    @property
+    def themes(self):
+        """
+        Theme dictionary shared by themes and startup_themes.
+        """
+        if "theme" not in self._columns:
+            blob, offsets = self.array("theme.dict"), self.array("theme.dict_offsets")
+            self._columns["theme"] = StringColumn(np.empty(0), blob, offsets)
+        return self._columns["theme"].dictionary
+
+    def __len__(self):
+        return self.meta["rows"]
+
+    def _slice(self, name, i):
+        offsets = self.array(f"{name}.offsets")
+        return slice(offsets[i], offsets[i + 1])
+
+    def theme_ids(self, i):
+        return self.array("themes.values")[self._slice("themes", i)]
+
+    def startup_themes(self, i):
+        rows = self._slice("startup_themes", i)
+        return [
+            [self.themes[theme], str(count)]
+            for theme, count in zip(
+                self.array("startup_themes.values")[rows],
+                self.array("startup_themes.counts")[rows],
+            )
+        ]
+
+    def startup_partners(self, i):
+        rows = self._slice("startup_partners", i)
+        columns = {name: self.column(f"partner.{name}") for name in PARTNER_COLUMNS}
+        return [
+            {name: column[j] for name, column in columns.items()}
+            for j in range(rows.start, rows.stop)
+        ]
+
+    def row(self, i):
+        """
+        Materializes row i in the crawler's record shape.
+        """
+        corp = {name: self.column(name)[i] for name in STRING_COLUMNS}
+        for name in INT_COLUMNS:
+            value = int(self.array(name)[i])
+            corp[name] = None if value == NULL else value
+        corp["startup_partners"] = self.startup_partners(i)
+        corp["startup_themes"] = self.startup_themes(i)
+        corp["themes"] = [self.themes[theme] for theme in self.theme_ids(i)]
+        return {field: corp[field] for field in RECORD_FIELDS}
+
+    def rows(self, indices):
+        return [self.row(int(i)) for i in indices]
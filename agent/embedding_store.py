@@ -0,0 +1,352 @@
+import os
+import fcntl
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "embedding_store")
+
+# Keys per SQLite statement, below its bound variable limit.
+LOOKUP_CHUNK = 500
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 100))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+
+
+def embedding_namespace(model: str, task_type: str) -> str:
+    return hashlib.sha256(f"{model}\0{task_type}".encode("utf-8")).hexdigest()
+
+
+def embedding_key(namespace: str, text: str) -> str:
+    return hashlib.sha256(f"{namespace}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Content-addressed, append-only store of embedding vectors.
+
+    Vectors are rows of a float32 matrix in vectors.<generation>.f32,
+    read through a memory map. index.sqlite maps each key, a hash of
+    (model, task_type, text), to its row. Writers append under a file
+    lock and commit the index only after the vectors are on disk, so
+    readers in other processes never see a row that is not written yet.
+    Compaction writes a new generation, so open maps stay valid.
+    """
+
+    def __init__(self, path=EMBEDDING_STORE_PATH):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.mapped = (None, None)
+
+        self.connection = sqlite3.connect(
+            os.path.join(path, "index.sqlite"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        # Switching a new database to WAL needs it to itself, so under the
+        # writer lock and outside a transaction.
+        with self.locked():
+            self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.writing():
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS vectors (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    row INTEGER NOT NULL
+                )
+                """)
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    generation INTEGER NOT NULL,
+                    rows INTEGER NOT NULL,
+                    dim INTEGER
+                )
+                """)
+            self.connection.execute("INSERT OR IGNORE INTO meta VALUES (0, 0, 0, NULL)")
+
+    def vectors_path(self, generation):
+        return os.path.join(self.path, f"vectors.{generation}.f32")
+
+    @contextmanager
+    def locked(self):
+        """
+        Serializes writers across threads and processes.
+        """
+        with self.lock, open(os.path.join(self.path, "lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    @contextmanager
+    def writing(self):
+        """
+        Runs a write transaction under the writer lock.
+        """
+        with self.locked():
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def meta(self):
+        return self.connection.execute(
+            "SELECT generation, rows, dim FROM meta"
+        ).fetchone()
+
+    def rows_for(self, keys):
+        found = {}
+        for i in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[i : i + LOOKUP_CHUNK]
+            found.update(
+                self.connection.execute(
+                    "SELECT key, row FROM vectors WHERE key IN"
+                    f" ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+            )
+        return found
+
+    def matrix(self, generation, rows, dim):
+        """
+        Returns a read-only map of the first rows vectors, remapping
+        when the store grew or was compacted since the last call.
+        """
+        mapped_generation, matrix = self.mapped
+        if mapped_generation != generation or len(matrix) < rows:
+            matrix = np.memmap(
+                self.vectors_path(generation),
+                dtype=np.float32,
+                mode="r",
+                shape=(rows, dim),
+            )
+            self.mapped = (generation, matrix)
+        return matrix
+
+    def get(self, keys):
+        """
+        Returns {key: vector} for the stored keys.
+        """
+        keys = list(dict.fromkeys(keys))
+        with self.lock:
+            while True:
+                self.connection.execute("BEGIN")
+                try:
+                    generation, rows, dim = self.meta()
+                    found = self.rows_for(keys)
+                finally:
+                    self.connection.execute("COMMIT")
+                if not found:
+                    return {}
+                try:
+                    matrix = self.matrix(generation, rows, dim)
+                    break
+                except FileNotFoundError:
+                    # Compacted by another process since the lookup.
+                    continue
+
+        vectors = np.asarray(matrix[list(found.values())])
+        return dict(zip(found, vectors))
+
+    def put(self, namespace, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(keys):
+            return
+
+        with self.writing():
+            generation, rows, dim = self.meta()
+            if dim is None:
+                dim = vectors.shape[1]
+            elif vectors.shape[1] != dim:
+                raise ValueError(f"Expected {dim}-dimensional vectors")
+
+            existing = self.rows_for(list(keys))
+            new = {}
+            for key, vector in zip(keys, vectors):
+                if key not in existing and key not in new:
+                    new[key] = vector
+            if not new:
+                return
+
+            # Write at the committed end, overwriting any tail a crashed
+            # writer may have left behind.
+            with open(self.vectors_path(generation), "ab+") as f:
+                f.truncate(rows * dim * 4)
+                f.write(np.stack(list(new.values())).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.connection.executemany(
+                "INSERT INTO vectors VALUES (?, ?, ?)",
+                [(key, namespace, rows + i) for i, key in enumerate(new)],
+            )
+            self.connection.execute(
+                "UPDATE meta SET rows = ?, dim = ?", (rows + len(new), dim)
+            )
+
+    def compact(self, namespaces=None):
+        """
+        Rewrites the vectors without orphaned rows, keeping only the given
+        namespaces when set. Returns the number of rows kept.
+        """
+        with self.writing():
+            generation, rows, dim = self.meta()
+            if dim is None:
+                return 0
+
+            if namespaces is not None:
+                namespaces = list(namespaces)
+                self.connection.execute(
+                    "DELETE FROM vectors WHERE namespace NOT IN"
+                    f" ({','.join('?' * len(namespaces))})",
+                    namespaces,
+                )
+            live = self.connection.execute(
+                "SELECT key, row FROM vectors ORDER BY row"
+            ).fetchall()
+
+            with open(self.vectors_path(generation + 1), "wb") as f:
+                if live:
+                    old = self.matrix(generation, rows, dim)
+                for i in range(0, len(live), LOOKUP_CHUNK):
+                    chunk = [row for _, row in live[i : i + LOOKUP_CHUNK]]
+                    f.write(old[chunk].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.connection.executemany(
+                "UPDATE vectors SET row = ? WHERE key = ?",
+                [(i, key) for i, (key, _) in enumerate(live)],
+            )
+            self.connection.execute(
+                "UPDATE meta SET generation = ?, rows = ?",
+                (generation + 1, len(live)),
+            )
+
+        # Readers that already mapped the old generation keep their map.
+        os.remove(self.vectors_path(generation))
+        return len(live)
+
+
+def embed_batch(embedding, texts):
+    """
+    Embeds texts with one bulk request. Returns one vector per text,
+    None for texts that could not be embedded.
+
+    A failed request is bisected, so one bad text only costs itself,
+    and single texts fall back to embed_query.
+    """
+    try:
+        vectors = embedding.embed_documents(texts)
+        if len(vectors) != len(texts):
+            raise ValueError(f"Got {len(vectors)} vectors for {len(texts)} texts")
+        return vectors
+    except Exception as e:
+        if len(texts) == 1:
+            logger.warning(f"Bulk embedding failed, embedding text alone: {e}")
+            try:
+                return [embedding.embed_query(texts[0])]
+            except Exception as e:
+                logger.error(f"Embedding text failed: {e}")
+                return [None]
+        logger.warning(f"Bulk embedding of {len(texts)} texts failed, splitting: {e}")
+
+    mid = len(texts) // 2
+    return embed_batch(embedding, texts[:mid]) + embed_batch(embedding, texts[mid:])
+
+
+class CachedEmbeddings:
+    """
+    Embeds texts through an EmbeddingStore, calling the provider only
+    for texts whose vectors are not stored yet.
+
+    Missing texts are sent in batches of batch_size, with at most
+    concurrency batches in flight. Every batch is stored as soon as it
+    completes, keeping the texts embedded even when others fail.
+    """
+
+    def __init__(
+        self,
+        embedding,
+        model,
+        task_type,
+        store: EmbeddingStore,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        concurrency=EMBEDDING_CONCURRENCY,
+    ):
+        self.embedding = embedding
+        self.namespace = embedding_namespace(model, task_type)
+        self.store = store
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+    def embed_missing(self, missing):
+        """
+        Embeds and stores {key: text}. Returns {key: vector} for the
+        texts that could be embedded.
+        """
+        keys, texts = list(missing), list(missing.values())
+        batches = [
+            (keys[i : i + self.batch_size], texts[i : i + self.batch_size])
+            for i in range(0, len(keys), self.batch_size)
+        ]
+
+        vectors = {}
+        with ThreadPoolExecutor(min(self.concurrency, len(batches))) as pool:
+            futures = {
+                pool.submit(embed_batch, self.embedding, batch_texts): batch_keys
+                for batch_keys, batch_texts in batches
+            }
+            for future in as_completed(futures):
+                embedded = [
+                    (key, vector)
+                    for key, vector in zip(futures[future], future.result())
+                    if vector is not None
+                ]
+                if not embedded:
+                    continue
+                batch_keys = [key for key, _ in embedded]
+                computed = np.asarray([vector for _, vector in embedded], np.float32)
+                self.store.put(self.namespace, batch_keys, computed)
+                vectors.update(zip(batch_keys, computed))
+
+        return vectors
+
+    def embed(self, texts):
+        """
+        Returns (vectors, failed): one row per text, and the indices of
+        texts that could not be embedded, whose rows are zero.
+        Raises if no text could be embedded.
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32), []
+        keys = [embedding_key(self.namespace, text) for text in texts]
+        vectors = self.store.get(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing[key] = text
+        if missing:
+            vectors.update(self.embed_missing(missing))
+        if not vectors:
+            raise RuntimeError(f"Embedding failed for all {len(texts)} texts")
+
+        dim = len(next(iter(vectors.values())))
+        matrix = np.zeros((len(keys), dim), dtype=np.float32)
+        failed = []
+        for i, key in enumerate(keys):
+            if key in vectors:
+                matrix[i] = vectors[key]
+            else:
+                failed.append(i)
+        return matrix, failed
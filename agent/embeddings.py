@@ -0,0 +1,208 @@
+import os
+import logging
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.preprocessing import normalize
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from embedding_store import EmbeddingStore, CachedEmbeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_TASK_TYPE = "semantic_similarity"
+
+# Leading embedding dimensions left out of clustering.
+EMBEDDING_OFFSET = 50
+
+# Local backend: hashed term features reduced to LOCAL_DIMENSIONS with SVD.
+LOCAL_FEATURES = 2**14
+LOCAL_DIMENSIONS = 100
+
+VIEWS = ("themes", "geography", "default")
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "google")  # or "local"
+
+
+def remote_embeddings(google_api_key, store=None) -> CachedEmbeddings:
+    embedding = GoogleGenerativeAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        google_api_key=google_api_key,
+        task_type=EMBEDDING_TASK_TYPE,
+    )
+    return CachedEmbeddings(
+        embedding, EMBEDDING_MODEL, EMBEDDING_TASK_TYPE, store or EmbeddingStore()
+    )
+
+
+def theme_text(corporate):
+    return " ".join(
+        [
+            (theme[0] + " ") * int(theme[1])
+            for theme in corporate["startup_themes"]
+            if theme[0] != "Other"
+        ]
+    )
+
+
+def view_name(group_by):
+    return group_by if group_by in VIEWS else "default"
+
+
+def view_text(view, corporate):
+    """
+    The text a corporate is embedded as for a grouping view.
+    """
+    if view == "themes":
+        return theme_text(corporate)
+    if view == "geography":
+        return " ".join([corporate.get("hq_city"), corporate.get("hq_country")])
+    return " ".join(
+        [corporate["name"], corporate["description"], theme_text(corporate)]
+    )
+
+
+def embed_view(view, corps, embeddings: CachedEmbeddings, strict=False) -> np.ndarray:
+    """
+    Embeds corporates for a view, one row per corporate.
+    Blank texts (no themes besides "Other") get zero vectors, and so do
+    texts that failed to embed, unless strict, which raises instead.
+    """
+    texts = [view_text(view, corporate) for corporate in corps]
+    filled = [i for i, text in enumerate(texts) if text.strip()]
+    vectors, failed = embeddings.embed([texts[i] for i in filled])
+    if failed:
+        message = f"Embedding failed for {len(failed)} of {len(filled)} {view} texts"
+        if strict:
+            raise RuntimeError(message)
+        logger.warning(f"{message}, using zero vectors")
+
+    matrix = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+    matrix[filled] = vectors
+    return matrix
+
+
+class EmbeddingProvider:
+    """
+    Turns corporates into the vectors they are clustered on, for one
+    grouping view. Vectors may be a dense array or a sparse matrix.
+    """
+
+    name = None
+
+    def embed_view(self, view, corps, strict=False):
+        """
+        strict raises when some corporates could not be embedded,
+        instead of giving them zero vectors.
+        """
+        raise NotImplementedError
+
+    def stable(self, view):
+        """
+        Whether a corporate's vector for view is the same whichever
+        corporates it is embedded with.
+        """
+        return True
+
+
+class RemoteEmbeddingProvider(EmbeddingProvider):
+    """
+    Embeds view texts with the remote model, through the embedding store.
+    """
+
+    name = "google"
+
+    def __init__(self, embeddings: CachedEmbeddings):
+        self.embeddings = embeddings
+
+    def embed_view(self, view, corps, strict=False):
+        matrix = embed_view(view, corps, self.embeddings, strict)
+        return matrix[:, EMBEDDING_OFFSET:]
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    Vectorizes on the CPU, without network calls.
+
+    The themes view is the exact theme-count vector from startup_themes,
+    as a sparse matrix. Other views are hashed TF-IDF term vectors
+    reduced with truncated SVD (LSA) and normalized.
+    """
+
+    name = "local"
+
+    def __init__(self, themes, dimensions=LOCAL_DIMENSIONS):
+        self.themes = {
+            theme: i
+            for i, theme in enumerate(theme for theme in themes if theme != "Other")
+        }
+        self.dimensions = dimensions
+        self.vectorizer = HashingVectorizer(
+            n_features=LOCAL_FEATURES, alternate_sign=False, norm=None
+        )
+
+    def theme_counts(self, corps):
+        rows, columns, counts = [], [], []
+        for row, corporate in enumerate(corps):
+            for theme, count in corporate["startup_themes"]:
+                if theme in self.themes:
+                    rows.append(row)
+                    columns.append(self.themes[theme])
+                    counts.append(int(count))
+        return sparse.csr_matrix(
+            (counts, (rows, columns)),
+            shape=(len(corps), len(self.themes)),
+            dtype=np.float32,
+        )
+
+    def embed_text(self, texts):
+        counts = self.vectorizer.transform(texts)
+        tfidf = TfidfTransformer().fit_transform(counts)
+
+        dimensions = min(self.dimensions, tfidf.shape[0] - 1)
+        if dimensions < 2:
+            return tfidf.astype(np.float32)
+        svd = TruncatedSVD(n_components=dimensions, random_state=42)
+        return normalize(svd.fit_transform(tfidf)).astype(np.float32)
+
+    def stable(self, view):
+        # SVD bases are fitted on each batch.
+        return view == "themes"
+
+    def embed_view(self, view, corps, strict=False):
+        if view == "themes":
+            return self.theme_counts(corps)
+        return self.embed_text([view_text(view, corporate) for corporate in corps])
+
+
+def make_provider(name, google_api_key=None, themes=()) -> EmbeddingProvider:
+    if name == LocalEmbeddingProvider.name:
+        return LocalEmbeddingProvider(themes)
+    if name == RemoteEmbeddingProvider.name:
+        return RemoteEmbeddingProvider(remote_embeddings(google_api_key))
+    raise ValueError(f"Unknown embedding provider: {name}")
+
+
+def view_columns(provider_name) -> list:
+    return [f"embedding.{provider_name}.{view}" for view in VIEWS]
+
+
+def embed_views(corps, provider: EmbeddingProvider) -> dict:
+    """
+    Embeds the whole corpus for every view, as dense store arrays
+    aligned with the corpus row order. A view with corporates that could
+    not be embedded is logged and left out, rather than stored with zero
+    vectors for them.
+    """
+    arrays = {}
+    for view, name in zip(VIEWS, view_columns(provider.name)):
+        try:
+            vectors = provider.embed_view(view, corps, strict=True)
+        except Exception as e:
+            logger.error(f"Embedding the {view} view failed, leaving it out: {e}")
+            continue
+        if sparse.issparse(vectors):
+            vectors = vectors.toarray()
+        arrays[name] = vectors
+    return arrays
@@ -0,0 +1,190 @@
+import re
+
+THEME_ALIASES = {
+    "ai": "Artificial Intelligence",
+    "ml": "Machine Learning",
+    "iot": "Internet of Things",
+    "nlp": "Natural Language Processing",
+    "ar": "Augmented Reality",
+    "vr": "Virtual Reality",
+    "hr": "Human Resources",
+    "ecommerce": "E-Commerce",
+    "e commerce": "E-Commerce",
+    "healthcare": "Health Care",
+    "self driving": "Autonomous Vehicles",
+}
+
+COUNTRY_ALIASES = {
+    "usa": "United States",
+    "u.s": "United States",
+    "america": "United States",
+    "uk": "United Kingdom",
+    "britain": "United Kingdom",
+    "great britain": "United Kingdom",
+    "england": "United Kingdom",
+    "holland": "Netherlands",
+    "the netherlands": "Netherlands",
+    "korea": "South Korea",
+    "german": "Germany",
+    "french": "France",
+    "british": "United Kingdom",
+    "american": "United States",
+    "italian": "Italy",
+    "spanish": "Spain",
+    "dutch": "Netherlands",
+    "swiss": "Switzerland",
+    "swedish": "Sweden",
+    "japanese": "Japan",
+    "chinese": "China",
+}
+
+# City names that are also everyday words, left to the LLM.
+AMBIGUOUS_CITIES = {"hard", "purchase", "croix"}
+
+GROUP_WORDS = {
+    "theme": "themes",
+    "themes": "themes",
+    "sector": "themes",
+    "sectors": "themes",
+    "industry": "themes",
+    "industries": "themes",
+    "topic": "themes",
+    "topics": "themes",
+    "thematically": "themes",
+    "geography": "geography",
+    "geographically": "geography",
+    "location": "geography",
+    "locations": "geography",
+    "country": "geography",
+    "countries": "geography",
+    "region": "geography",
+    "regions": "geography",
+    "city": "geography",
+    "cities": "geography",
+    "place": "geography",
+    "hq": "geography",
+    "headquarters": "geography",
+}
+
+GROUP_MARKERS = {"by", "per", "grouped", "group", "cluster", "clustered", "groups"}
+
+# Function words only. Words that can carry meaning ("IT", "space") are
+# left out, so queries using them go to the LLM.
+STOPWORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "based", "businesses",
+    "companies", "company", "corporate", "corporates", "corporations",
+    "find", "firms", "focused", "for", "from", "get", "give", "headquartered",
+    "in", "is", "list", "located", "me", "of", "on", "or",
+    "please", "show", "that", "the", "their", "them", "these", "those",
+    "to", "which", "with", "working", "active", "investing", "doing",
+    "field", "area", "want", "see", "i", "can", "you", "what",
+    "who", "there", "related", "partnering", "partners", "startups",
+    "startup", "into", "then", "also", "each", "other",
+}  # fmt: skip
+
+
+def tokenize(text):
+    tokens = re.findall(r"[\w][\w.&+'-]*", text.lower())
+    return [token.rstrip(".'-") for token in tokens if token.rstrip(".'-")]
+
+
+class FastParser:
+    """
+    Rule- and dictionary-based query parser.
+
+    Matches the longest known phrases (themes, countries, cities and
+    their aliases) and grouping words, and returns the same
+    {"filter", "group_by"} structure as the LLM parser. Returns None
+    whenever a word is left unexplained or the query needs more than
+    the filter can express, so the LLM handles it instead.
+    """
+
+    def __init__(self, themes, countries, cities):
+        self.phrases = {}
+        for city in cities:
+            if city.strip().lower() not in AMBIGUOUS_CITIES:
+                self.add(city, "hq_city", city.strip())
+        for country in countries:
+            self.add(country, "hq_country", country)
+        for alias, country in COUNTRY_ALIASES.items():
+            self.add(alias, "hq_country", country)
+        for theme in themes:
+            self.add(theme, "themes", theme)
+        for alias, theme in THEME_ALIASES.items():
+            self.add(alias, "themes", theme)
+        self.max_length = max((len(phrase) for phrase in self.phrases), default=1)
+
+    def add(self, phrase, kind, value):
+        tokens = tuple(tokenize(phrase))
+        if tokens:
+            self.phrases[tokens] = (kind, value)
+
+    def match(self, tokens, i):
+        for length in range(min(self.max_length, len(tokens) - i), 0, -1):
+            found = self.phrases.get(tuple(tokens[i : i + length]))
+            if found:
+                return length, found
+        return 0, None
+
+    def parse(self, query):
+        """
+        Returns {"filter", "group_by"} or None when not confident.
+        """
+        tokens = tokenize(query)
+        themes, places, group_by = [], {}, None
+        recognized = False
+
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+
+            if token in GROUP_MARKERS:
+                j = i + 1
+                while j < len(tokens) and tokens[j] in {"their", "the", "its", "by"}:
+                    j += 1
+                if j < len(tokens) and tokens[j] in GROUP_WORDS:
+                    if group_by not in (None, GROUP_WORDS[tokens[j]]):
+                        return None
+                    group_by = GROUP_WORDS[tokens[j]]
+                    recognized = True
+                    i = j + 1
+                    continue
+                if token == "by":
+                    return None
+
+            if token in ("geographically", "thematically"):
+                group_by = GROUP_WORDS[token]
+                recognized = True
+                i += 1
+                continue
+
+            length, found = self.match(tokens, i)
+            if found:
+                kind, value = found
+                if kind == "themes":
+                    if value not in themes:
+                        themes.append(value)
+                else:
+                    places.setdefault(kind, set()).add(value)
+                recognized = True
+                i += length
+                continue
+
+            if token in STOPWORDS or token in GROUP_MARKERS:
+                i += 1
+                continue
+
+            return None
+
+        # A string filter holds one value, several countries or cities
+        # need the LLM (or a narrower query).
+        if any(len(values) > 1 for values in places.values()):
+            return None
+        if not recognized:
+            return None
+
+        filter_criteria = {kind: values.pop() for kind, values in places.items()}
+        if themes:
+            filter_criteria["themes"] = themes
+
+        return {"filter": filter_criteria, "group_by": group_by or "default"}
@@ -0,0 +1,90 @@
+import os
+import sys
+from collections import OrderedDict
+import numpy as np
+
+FILTER_CACHE_BYTES = int(os.getenv("FILTER_CACHE_BYTES", 64 * 1024 * 1024))
+
+
+def canonical_filter(filter_criteria: dict) -> tuple:
+    """
+    Normalizes a parsed filter into a hashable cache key.
+
+    Keys are sorted and substring values lowercased, since those filters
+    are case-insensitive. Themes match exactly, so theme lists only become
+    sorted sets.
+    """
+    items = []
+    for key, value in sorted(filter_criteria.items()):
+        if key == "themes":
+            value = tuple(sorted(set(value)))
+        else:
+            value = str(value).lower()
+        items.append((key, value))
+    return tuple(items)
+
+
+def key_size(key):
+    return sys.getsizeof(key) + sum(
+        sys.getsizeof(part) for item in key for part in item
+    )
+
+
+class FilterCache:
+    """
+    LRU cache of filter results, bounded by memory.
+
+    Entries belong to one corpus store version and are dropped as soon as
+    a lookup comes in for another version.
+    """
+
+    def __init__(self, max_bytes=FILTER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def lookup(self, version, filter_criteria, compute):
+        """
+        Returns the cached rows for the filter, or computes and caches
+        them with compute(filter_criteria).
+        """
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+        key = canonical_filter(filter_criteria)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        self.misses += 1
+        rows = np.array(compute(filter_criteria))
+        rows.setflags(write=False)
+
+        size = rows.nbytes + key_size(key)
+        if size <= self.max_bytes:
+            self.entries[key] = (rows, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.bytes -= evicted
+
+        return rows
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+        }
@@ -0,0 +1,98 @@
+import json
+import logging
+import unicodedata
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bundled offline gazetteer, built from GeoNames by build_gazetteer.py.
+GAZETTEER_PATH = "gazetteer.json"
+
+# Letters NFKD does not decompose into ASCII.
+FOLDED_LETTERS = str.maketrans({"ø": "o", "æ": "ae", "ß": "ss", "ł": "l", "đ": "d"})
+
+
+def fold(name: str) -> str:
+    """
+    Normalizes a place name for lookup: lowercase, accents stripped,
+    hyphens and repeated whitespace collapsed.
+    """
+    name = unicodedata.normalize("NFKD", name.lower().translate(FOLDED_LETTERS))
+    name = name.encode("ascii", "ignore").decode("ascii")
+    return " ".join(name.replace("-", " ").split())
+
+
+class Gazetteer:
+    """
+    Offline place lookup, city and country name -> (lat, lon).
+
+    Cities are looked up within their country. Unknown cities fall
+    back to the country's centroid.
+    """
+
+    def __init__(self, path=GAZETTEER_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        self.codes, self.countries = {}, {}
+        for code, country in data["countries"].items():
+            self.countries[code] = tuple(country["coordinates"])
+            for name in country["names"]:
+                self.codes[fold(name)] = code
+        self.cities = {
+            code: {name: tuple(coordinates) for name, coordinates in cities.items()}
+            for code, cities in data["cities"].items()
+        }
+
+    def locate(self, city, country):
+        """
+        Returns (lat, lon, exact), exact being False for a country
+        centroid, or None for an unknown country.
+        """
+        code = self.codes.get(fold(country or ""))
+        if code is None:
+            return None
+        coordinates = self.cities.get(code, {}).get(fold(city or ""))
+        if coordinates is not None:
+            return (*coordinates, True)
+        return (*self.countries[code], False)
+
+
+def geocode(corps, gazetteer: Gazetteer) -> dict:
+    """
+    Locates corporates' headquarters, as store arrays aligned with the
+    corpus row order: geo.lat and geo.lon (NaN when the country is
+    unknown) and geo.exact (0 where the country centroid was used).
+    """
+    lat = np.full(len(corps), np.nan, dtype=np.float32)
+    lon = np.full(len(corps), np.nan, dtype=np.float32)
+    exact = np.zeros(len(corps), dtype=np.int8)
+
+    unknown = set()
+    for i, corp in enumerate(corps):
+        location = gazetteer.locate(corp.get("hq_city"), corp.get("hq_country"))
+        if location is None:
+            unknown.add(corp.get("hq_country"))
+            continue
+        lat[i], lon[i], exact[i] = location
+
+    if unknown:
+        logger.warning(f"Countries missing from the gazetteer: {sorted(unknown)}")
+    logger.info(
+        f"Geocoded {int(exact.sum())} of {len(corps)} corporates to their city, "
+        f"{int(np.isfinite(lat).sum() - exact.sum())} to their country"
+    )
+    return {"geo.lat": lat, "geo.lon": lon, "geo.exact": exact}
+
+
+def unit_vectors(lat, lon) -> np.ndarray:
+    """
+    Points on the unit sphere, so euclidean distances between them grow
+    monotonically with great-circle distance. Unknown places map to
+    the origin.
+    """
+    lat, lon = np.radians(lat), np.radians(lon)
+    points = np.column_stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+    return np.nan_to_num(points, nan=0.0)
@@ -1,45 +1,229 @@
 import os
+import re
+import glob
 import json
+import pickle
+import hashlib
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from corp_store import write_store, read_meta, STORE_PATH
+from embeddings import EMBEDDING_PROVIDER, embed_views, make_provider, view_columns
+from gazetteer import Gazetteer, geocode
 
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
-def load_json_files(dir):
-    data_dict = {"corps": []}
+DATA_DIR = "./data"
 
-    for filename in os.listdir(dir):
-        if filename.endswith(".json"):
-            filepath = os.path.join(dir, filename)
-            with open(filepath, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                for corp in data:
-                    themes = set()
+# Parsed shards and their mtime/size/hash, so unchanged shards are never
+# read or parsed again.
+CACHE_PATH = "preprocess_cache"
 
-                    # Unacceptable nulls
 
-                    name = corp.get("name")
-                    descrp = corp.get("description")
-                    city = corp.get("hq_city")
-                    country = corp.get("hq_country")
+def clean_corps(data):
+    corps = []
+    for corp in data:
+        themes = set()
 
-                    if (
-                        name is None
-                        or descrp is None
-                        or city is None
-                        or country is None
-                    ):
-                        continue
+        # Unacceptable nulls
 
-                    for st in corp["startup_themes"]:
-                        if st[0] != "Other":
-                            themes.add(st[0])
+        name = corp.get("name")
+        descrp = corp.get("description")
+        city = corp.get("hq_city")
+        country = corp.get("hq_country")
 
-                    corp["themes"] = list(themes)
-                    data_dict["corps"].append(corp)
+        if name is None or descrp is None or city is None or country is None:
+            continue
 
-    return data_dict
+        for st in corp["startup_themes"]:
+            if st[0] != "Other":
+                themes.add(st[0])
 
+        corp["themes"] = list(themes)
+        corps.append(corp)
 
-corp_data = load_json_files("./data")
+    return corps
 
 
-with open("corp_data.json", "w") as f:
-    f.write(json.dumps(corp_data, indent=2))
+def parse_shard(filepath):
+    with open(filepath, "r", encoding="utf-8") as f:
+        return clean_corps(json.load(f))
+
+
+def file_hash(filepath):
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def page_number(filename):
+    match = re.search(r"(\d+)", filename)
+    return int(match.group(1)) if match else 0
+
+
+def load_state(cache_path):
+    try:
+        with open(os.path.join(cache_path, "shards.json"), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_state(cache_path, state):
+    path = os.path.join(cache_path, "shards.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def cache_file(cache_path, filename):
+    return os.path.join(cache_path, filename + ".pickle")
+
+
+def merge_shards(shards, state, cache_path):
+    """
+    Merges cached shards into one corpus, deduplicated by corporate id.
+
+    Rows keep page order. When an id is on more than one page, the record
+    from the most recently written shard wins.
+    """
+    merged, owner_mtime = {}, {}
+    for filename in shards:
+        mtime = state[filename]["mtime"]
+        with open(cache_file(cache_path, filename), "rb") as f:
+            corps = pickle.load(f)
+        for corp in corps:
+            if corp["id"] not in merged or mtime > owner_mtime[corp["id"]]:
+                merged[corp["id"]] = corp
+                owner_mtime[corp["id"]] = mtime
+    return list(merged.values())
+
+
+def store_complete(store_path, provider_name):
+    """
+    Whether the store has the coordinates and every view embedding, or
+    recorded them as skipped when it was written. Skipped arrays are
+    tried again the next time the shards change.
+    """
+    meta = read_meta(store_path) or {}
+    present = set(meta.get("columns", {})) | set(meta.get("skipped", []))
+    return all(name in present for name in ["geo.lat"] + view_columns(provider_name))
+
+
+def corpus_themes(corps):
+    return sorted({theme for corp in corps for theme, _ in corp["startup_themes"]})
+
+
+def preprocess(
+    data_dir=DATA_DIR,
+    store_path=STORE_PATH,
+    cache_path=CACHE_PATH,
+    workers=None,
+    provider=None,
+):
+    """
+    Incrementally rebuilds the corpus store from the crawl shards.
+
+    Shards whose mtime and size are unchanged are skipped without being
+    read, touched shards are hashed, and only shards whose content changed
+    are parsed again, in parallel. Returns whether the store was rewritten.
+
+    Headquarters are geocoded with the bundled gazetteer. Every grouping
+    view is embedded for the whole corpus with provider
+    (EMBEDDING_PROVIDER by default) and stored with the columns. The
+    remote provider only sends texts missing from the embedding store.
+    """
+    os.makedirs(cache_path, exist_ok=True)
+    state = load_state(cache_path)
+
+    shards = sorted(
+        (
+            os.path.basename(path)
+            for path in glob.glob(os.path.join(data_dir, "corp_*.json"))
+        ),
+        key=page_number,
+    )
+
+    changed, touched = [], False
+    for filename in shards:
+        filepath = os.path.join(data_dir, filename)
+        stat = os.stat(filepath)
+        entry = state.get(filename)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            continue
+
+        digest = file_hash(filepath)
+        if entry and entry["hash"] == digest:
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            touched = True
+            continue
+
+        state[filename] = {"mtime": stat.st_mtime, "size": stat.st_size, "hash": digest}
+        changed.append(filename)
+
+    removed = [filename for filename in state if filename not in shards]
+    for filename in removed:
+        del state[filename]
+        if os.path.exists(cache_file(cache_path, filename)):
+            os.remove(cache_file(cache_path, filename))
+
+    provider_name = provider.name if provider else EMBEDDING_PROVIDER
+    if not changed and not removed and store_complete(store_path, provider_name):
+        if touched:
+            save_state(cache_path, state)
+        skipped = read_meta(store_path).get("skipped")
+        if skipped:
+            logger.warning(f"Store was written without {skipped}, retried on change")
+        logger.info("Corpus store is up to date")
+        return False
+
+    paths = [os.path.join(data_dir, filename) for filename in changed]
+    if len(paths) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            parsed = list(pool.map(parse_shard, paths))
+    else:
+        parsed = [parse_shard(path) for path in paths]
+
+    for filename, corps in zip(changed, parsed):
+        with open(cache_file(cache_path, filename), "wb") as f:
+            pickle.dump(corps, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    corps = merge_shards(shards, state, cache_path)
+
+    try:
+        coordinates = geocode(corps, Gazetteer())
+    except FileNotFoundError as e:
+        logger.error(f"Gazetteer not found, geography will be embedded: {e}")
+        coordinates = {}
+
+    try:
+        provider = provider or make_provider(
+            provider_name, os.getenv("GOOGLE_API_KEY"), corpus_themes(corps)
+        )
+        views = embed_views(corps, provider)
+    except Exception as e:
+        logger.error(f"Embedding provider failed, clustering will embed on demand: {e}")
+        views = {}
+
+    extra = {**coordinates, **views}
+    skipped = [
+        name
+        for name in ["geo.lat", "geo.lon", "geo.exact"] + view_columns(provider_name)
+        if name not in extra
+    ]
+    written = write_store(corps, store_path, extra=extra, skipped=skipped)
+    save_state(cache_path, state)
+
+    logger.info(
+        f"Parsed {len(changed)} shard(s), {len(corps)} corporates, "
+        f"rewrote {len(written)} column file(s)"
+    )
+    return True
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    preprocess()
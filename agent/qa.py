@@ -0,0 +1,162 @@
+import os
+import numpy as np
+from scipy import sparse
+from sklearn.metrics.pairwise import euclidean_distances
+
+# Verdict thresholds, the clusters pass when every metric meets its own.
+QA_SILHOUETTE = float(os.getenv("QA_SILHOUETTE", 0.5))
+QA_CALINSKI_HARABASZ = float(os.getenv("QA_CALINSKI_HARABASZ", 500))
+QA_DAVIES_BOULDIN = float(os.getenv("QA_DAVIES_BOULDIN", 1.5))
+# Share of points density engines may leave as noise.
+QA_MAX_NOISE = float(os.getenv("QA_MAX_NOISE", 0.5))
+
+# Above this many points the silhouette is estimated from a sample.
+QA_SAMPLE_THRESHOLD = int(os.getenv("QA_SAMPLE_THRESHOLD", 2000))
+QA_SAMPLE_SIZE = int(os.getenv("QA_SAMPLE_SIZE", 1000))
+# z for the silhouette estimate's confidence interval (95%).
+QA_CONFIDENCE_Z = float(os.getenv("QA_CONFIDENCE_Z", 1.96))
+
+# Distance matrix block size, in floats.
+BLOCK_SIZE = 1 << 23
+
+RANDOM_STATE = 42
+
+
+def row_norms_squared(X):
+    if sparse.issparse(X):
+        return np.asarray(X.multiply(X).sum(axis=1)).ravel()
+    return np.einsum("ij,ij->i", X, X)
+
+
+def centroid_distances_squared(X, centroids, labels):
+    """
+    Squared distance of every point to its cluster's centroid.
+    """
+    if sparse.issparse(X):
+        cross = np.asarray(X.multiply(centroids[labels]).sum(axis=1)).ravel()
+        squared = (
+            row_norms_squared(X) - 2 * cross + row_norms_squared(centroids)[labels]
+        )
+        return np.maximum(squared, 0)
+    return row_norms_squared(X - centroids[labels])
+
+
+def silhouettes(X, labels, onehot, sizes, sample):
+    """
+    Exact silhouette of each sampled point against every point,
+    computed in blocks of sampled rows.
+    """
+    n, k = onehot.shape
+    norms = row_norms_squared(X)
+    block = max(1, BLOCK_SIZE // n)
+
+    values = []
+    for start in range(0, len(sample), block):
+        rows = sample[start : start + block]
+        distances = euclidean_distances(
+            X[rows], X, X_norm_squared=norms[rows, None], Y_norm_squared=norms[None, :]
+        )
+        distances[np.arange(len(rows)), rows] = 0
+        sums = np.asarray(onehot.T.dot(distances.T).T)
+
+        own = labels[rows]
+        a = sums[np.arange(len(rows)), own] / np.maximum(sizes[own] - 1, 1)
+        means = sums / sizes
+        means[np.arange(len(rows)), own] = np.inf
+        b = means.min(axis=1)
+
+        s = (b - a) / np.maximum(a, b)
+        s[sizes[own] == 1] = 0
+        values.append(np.nan_to_num(s))
+    return np.concatenate(values)
+
+
+def cluster_metrics(X, labels):
+    """
+    Silhouette, Calinski-Harabasz and Davies-Bouldin scores in one pass
+    over shared centroids and point-to-centroid distances.
+
+    The silhouette is exact up to QA_SAMPLE_THRESHOLD points. Above, it
+    is the mean exact silhouette of QA_SAMPLE_SIZE sampled points, with
+    a confidence interval.
+    """
+    n = X.shape[0]
+    clusters, labels = np.unique(labels, return_inverse=True)
+    k = len(clusters)
+
+    onehot = sparse.csr_matrix(
+        (np.ones(n), (np.arange(n), labels)), shape=(n, k), dtype=np.float64
+    )
+    sizes = np.bincount(labels, minlength=k).astype(np.float64)
+    sums = onehot.T.dot(X)
+    centroids = (sums.toarray() if sparse.issparse(sums) else sums) / sizes[:, None]
+
+    squared = centroid_distances_squared(X, centroids, labels)
+    mean = np.asarray(X.mean(axis=0)).ravel()
+
+    extra = float((sizes * ((centroids - mean) ** 2).sum(axis=1)).sum())
+    intra = float(squared.sum())
+    calinski_harabasz = 1.0 if intra == 0 else extra * (n - k) / (intra * (k - 1))
+
+    spread = np.bincount(labels, weights=np.sqrt(squared), minlength=k) / sizes
+    between = euclidean_distances(centroids)
+    if np.allclose(spread, 0) or np.allclose(between, 0):
+        davies_bouldin = 0.0
+    else:
+        between[between == 0] = np.inf
+        ratios = (spread[:, None] + spread[None, :]) / between
+        davies_bouldin = float(ratios.max(axis=1).mean())
+
+    if n > QA_SAMPLE_THRESHOLD:
+        sample = np.random.default_rng(RANDOM_STATE).choice(
+            n, QA_SAMPLE_SIZE, replace=False
+        )
+    else:
+        sample = np.arange(n)
+    values = silhouettes(X, labels, onehot, sizes, sample)
+    silhouette = float(values.mean())
+
+    interval = None
+    if len(sample) < n:
+        margin = QA_CONFIDENCE_Z * values.std(ddof=1) / np.sqrt(len(values))
+        interval = [silhouette - float(margin), silhouette + float(margin)]
+
+    return {
+        "silhouette": silhouette,
+        "silhouette_ci": interval,
+        "calinski-harabasz": calinski_harabasz,
+        "davies-bouldin": davies_bouldin,
+    }
+
+
+def evaluate(X, labels):
+    """
+    Scores the clusters and decides a verdict, "pass" or "warn" with
+    the reasons. Noise points (label -1) are left out of the metrics.
+    """
+    labels = np.asarray(labels)
+    noise = labels == -1
+    results = {"noise": float(noise.mean()) if len(labels) else 0.0}
+    reasons = []
+
+    if noise.any():
+        X, labels = X[~noise], labels[~noise]
+        if results["noise"] > QA_MAX_NOISE:
+            reasons.append(f"High noise share: {results['noise']:.2f}")
+
+    if len(np.unique(labels)) < 2 or len(labels) < 3:
+        reasons.append("Fewer than two clusters")
+        return {**results, "verdict": "warn", "reasons": reasons}
+
+    results.update(cluster_metrics(X, labels))
+
+    if results["silhouette"] < QA_SILHOUETTE:
+        reasons.append(f"Low silhouette score: {results['silhouette']}")
+    if results["calinski-harabasz"] < QA_CALINSKI_HARABASZ:
+        reasons.append(f"Low Calinski-Harabasz score: {results['calinski-harabasz']}")
+    if results["davies-bouldin"] > QA_DAVIES_BOULDIN:
+        reasons.append(f"High Davies-Bouldin score: {results['davies-bouldin']}")
+
+    results["verdict"] = "warn" if reasons else "pass"
+    results["reasons"] = reasons
+    return results
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "query_cache.sqlite")
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 30 * 24 * 3600))  # seconds
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", 10000))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class QueryCache:
+    """
+    Persistent cache of query text -> parsed_query, in SQLite.
+
+    Entries are namespaced by the model name and a hash of the prompt
+    template, so changing either never serves stale parses. Entries
+    expire after ttl seconds, and the least recently used ones are
+    evicted beyond max_entries.
+    """
+
+    def __init__(
+        self,
+        model,
+        prompt_template,
+        path=QUERY_CACHE_PATH,
+        ttl=QUERY_CACHE_TTL,
+        max_entries=QUERY_CACHE_MAX_ENTRIES,
+    ):
+        self.namespace = hashlib.sha256(
+            f"{model}\0{prompt_template}".encode("utf-8")
+        ).hexdigest()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS parsed_queries (
+                key TEXT PRIMARY KEY,
+                parsed TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS parsed_queries_accessed"
+            " ON parsed_queries (accessed_at)"
+        )
+        self.connection.commit()
+
+    def key(self, query):
+        normalized = normalize_query(query)
+        return hashlib.sha256(
+            f"{self.namespace}\0{normalized}".encode("utf-8")
+        ).hexdigest()
+
+    def get(self, query):
+        """
+        Returns the cached parsed_query, or None if missing or expired.
+        """
+        key, now = self.key(query), time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT parsed, created_at FROM parsed_queries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            parsed, created_at = row
+            if now - created_at > self.ttl:
+                self.connection.execute(
+                    "DELETE FROM parsed_queries WHERE key = ?", (key,)
+                )
+                return None
+
+            self.connection.execute(
+                "UPDATE parsed_queries SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(parsed)
+
+    def put(self, query, parsed_query):
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO parsed_queries VALUES (?, ?, ?, ?)",
+                (self.key(query), json.dumps(parsed_query), now, now),
+            )
+            self.evict(now)
+
+    def evict(self, now):
+        self.connection.execute(
+            "DELETE FROM parsed_queries WHERE created_at < ?", (now - self.ttl,)
+        )
+        self.connection.execute(
+            """
+            DELETE FROM parsed_queries WHERE key IN (
+                SELECT key FROM parsed_queries
+                ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
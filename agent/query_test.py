@@ -13,12 +13,13 @@ from sklearn.metrics import (
     davies_bouldin_score,
 )
 import matplotlib.pyplot as plt
+from corp_store import CorpStore
 
 load_dotenv()
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-with open("corp_data.json", "r") as f:
-    CORP_DATA = json.load(f)
+STORE = CorpStore()
+CORP_DATA = STORE.rows(range(len(STORE)))
 
 LLM = ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=GOOGLE_API_KEY)
 
@@ -250,7 +251,7 @@ criteria = parse_query("Get the companies in AI and group them by their location
 print(criteria)
 filter_criteria = criteria["filter"]
 group_criteria = criteria["group_by"]
-corps = fetch_data(filter_criteria, CORP_DATA["corps"])
+corps = fetch_data(filter_criteria, CORP_DATA)
 
 with open("filtered_corps.json", "w") as f:
     f.write(json.dumps(corps, indent=2))
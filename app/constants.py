@@ -1,10 +1,13 @@
-PAGE_RANGE = 28
+import os
 
-ENDPOINT = "https://ranking.glassdollar.com/graphql"
+# Pages are discovered, not configured: PAGE_WINDOW pages are probed
+# concurrently until the first page with empty rows.
+PAGE_WINDOW = int(os.getenv("CRAWL_PAGE_WINDOW", 8))
+MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", 10000))
 
-CORP_BY_ID_QUERY = """
-query ($id: String!) {
-  corporate(id: $id) {
+ENDPOINT = os.getenv("CRAWL_ENDPOINT", "https://ranking.glassdollar.com/graphql")
+
+CORP_FIELDS = """{
     id
     name
     description
@@ -28,8 +31,12 @@ query ($id: String!) {
     startup_themes
     startup_friendly_badge
     __typename
-  }
-}
+  }"""
+
+CORP_BY_ID_QUERY = f"""
+query ($id: String!) {{
+  corporate(id: $id) {CORP_FIELDS}
+}}
 """
 
 LIST_CORP_QUERY = """
@@ -42,14 +49,58 @@ query ExampleQuery($filters: CorporateFilters, $page: Int, $sortBy: String) {
 }
 """
 
-LIST_CORP_PAYLOAD = {
-    "variables": {"filters": {"hq_city": [], "industry": []}, "page": 27},
-    "query": LIST_CORP_QUERY,
-}
 
-CORP_BY_ID_PAYLOAD = {
-    "query": CORP_BY_ID_QUERY,
-    "variables": {
-        "id": "8483fc50-b82d-5ffa-5f92-6c72ac4bdaff",
-    },
-}
+def list_corp_payload(page):
+    """
+    Builds a corporates-page payload.
+    A new dict per call, so concurrent requests never share one.
+    """
+    return {
+        "variables": {"filters": {"hq_city": [], "industry": []}, "page": page},
+        "query": LIST_CORP_QUERY,
+    }
+
+
+def corp_by_id_payload(corp_id):
+    """
+    Builds a corporate-by-id payload.
+    A new dict per call, so concurrent requests never share one.
+    """
+    return {
+        "query": CORP_BY_ID_QUERY,
+        "variables": {"id": corp_id},
+    }
+
+
+# Crawler tuning, overridable from the environment.
+CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", 16))
+RATE_LIMIT = float(os.getenv("CRAWL_RATE_LIMIT", 25))  # requests per second
+RATE_BURST = int(os.getenv("CRAWL_RATE_BURST", CONCURRENCY))
+MAX_RETRIES = int(os.getenv("CRAWL_MAX_RETRIES", 5))
+BACKOFF_BASE = float(os.getenv("CRAWL_BACKOFF_BASE", 0.5))  # seconds
+BACKOFF_CAP = float(os.getenv("CRAWL_BACKOFF_CAP", 30))  # seconds
+REQUEST_TIMEOUT = float(os.getenv("CRAWL_REQUEST_TIMEOUT", 30))  # seconds
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Corporates per batched GraphQL request, 1 disables batching.
+BATCH_SIZE = int(os.getenv("CRAWL_BATCH_SIZE", 10))
+
+# Corporates per Celery task, 1 dispatches one task per batch/corporate.
+CHUNK_SIZE = int(os.getenv("CRAWL_CHUNK_SIZE", 100))
+# Batched requests a chunk task keeps in flight on its worker's session.
+CHUNK_CONCURRENCY = int(os.getenv("CRAWL_CHUNK_CONCURRENCY", 4))
+
+# Spool mode: chunk tasks write records to SPOOL_DIR and return only
+# a reference, so corporate data never goes through the result backend.
+SPOOL = os.getenv("CRAWL_SPOOL", "0") == "1"
+SPOOL_DIR = os.getenv("CRAWL_SPOOL_DIR", "./data/spool")
+DATA_DIR = os.getenv("CRAWL_DATA_DIR", "./data")
+
+# Incremental crawl: records older than MAX_AGE seconds are refetched.
+MANIFEST_DIR = os.getenv("CRAWL_MANIFEST_DIR", os.path.join(DATA_DIR, "manifest"))
+MAX_AGE = float(os.getenv("CRAWL_MAX_AGE", 7 * 24 * 3600))
+
+# Crawl job tracking, kept in Redis so every API worker sees it.
+JOBS_REDIS_URL = os.getenv("CRAWL_JOBS_REDIS_URL", "redis://redis:6379/2")
+JOB_TTL = int(os.getenv("CRAWL_JOB_TTL", 7 * 24 * 3600))  # seconds
+LATENCY_SAMPLES = int(os.getenv("CRAWL_LATENCY_SAMPLES", 10000))
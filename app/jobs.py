@@ -0,0 +1,165 @@
+import logging
+import time
+from functools import wraps
+import redis
+from constants import JOBS_REDIS_URL, JOB_TTL, LATENCY_SAMPLES
+
+logger = logging.getLogger(__name__)
+
+client = redis.Redis.from_url(JOBS_REDIS_URL, decode_responses=True)
+
+
+def job_key(job_id):
+    return f"crawl:job:{job_id}"
+
+
+def latency_key(job_id):
+    return f"crawl:job:{job_id}:latency"
+
+
+def tracked(func):
+    """
+    Makes a tracking call a no-op without a job id, and keeps Redis
+    errors from failing the crawl itself.
+    """
+
+    @wraps(func)
+    def wrapper(job_id, *args, **kwargs):
+        if job_id is None:
+            return None
+        try:
+            return func(job_id, *args, **kwargs)
+        except redis.RedisError as e:
+            logger.warning(f"Job tracking failed for {job_id}: {e}")
+            return None
+
+    return wrapper
+
+
+@tracked
+def create_job(job_id):
+    """
+    Registers a crawl job while its pages are being discovered.
+    """
+    client.hset(
+        job_key(job_id),
+        mapping={
+            "status": "discovering pages",
+            "pages_total": 0,
+            "pages_done": 0,
+            "pages_failed": 0,
+            "corps_fetched": 0,
+            "failures": 0,
+            "requests": 0,
+            "started_at": time.time(),
+            "finished_at": "",
+            "error": "",
+        },
+    )
+    client.expire(job_key(job_id), JOB_TTL)
+
+
+@tracked
+def start_job(job_id, pages_total):
+    """
+    Sets the number of pages the job has to finish.
+    """
+    mapping = {"status": "in progress", "pages_total": pages_total}
+    if pages_total == 0:
+        mapping.update(status="completed", finished_at=time.time())
+    client.hset(job_key(job_id), mapping=mapping)
+
+
+@tracked
+def record_request(job_id, latency):
+    pipe = client.pipeline()
+    pipe.hincrby(job_key(job_id), "requests", 1)
+    pipe.lpush(latency_key(job_id), latency)
+    pipe.ltrim(latency_key(job_id), 0, LATENCY_SAMPLES - 1)
+    pipe.expire(latency_key(job_id), JOB_TTL)
+    pipe.execute()
+
+
+@tracked
+def record_corps(job_id, count):
+    client.hincrby(job_key(job_id), "corps_fetched", count)
+
+
+@tracked
+def record_failures(job_id, count=1):
+    client.hincrby(job_key(job_id), "failures", count)
+
+
+@tracked
+def record_page_done(job_id, failed=False):
+    """
+    Marks a page finished. Once every page is, the job is "completed",
+    or "failed" if any page failed.
+    """
+    pipe = client.pipeline()
+    pipe.hincrby(job_key(job_id), "pages_done", 1)
+    pipe.hincrby(job_key(job_id), "pages_failed", int(failed))
+    pipe.hget(job_key(job_id), "pages_total")
+    pages_done, pages_failed, pages_total = pipe.execute()
+    if pages_done >= int(pages_total or 0):
+        client.hset(
+            job_key(job_id),
+            mapping={
+                "status": "failed" if pages_failed else "completed",
+                "finished_at": time.time(),
+            },
+        )
+
+
+@tracked
+def fail_job(job_id, error):
+    """
+    Marks the whole job failed, e.g. when page discovery fails.
+    """
+    client.hset(
+        job_key(job_id),
+        mapping={"status": "failed", "error": str(error), "finished_at": time.time()},
+    )
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def job_status(job_id):
+    """
+    Returns the job's counters and throughput,
+    or None when the job does not exist.
+    """
+    job = client.hgetall(job_key(job_id))
+    if not job:
+        return None
+
+    started_at = float(job["started_at"])
+    finished_at = float(job["finished_at"]) if job["finished_at"] else time.time()
+    elapsed = max(finished_at - started_at, 1e-9)
+    requests_made = int(job["requests"])
+
+    latencies = sorted(float(v) for v in client.lrange(latency_key(job_id), 0, -1))
+    p50, p95 = percentile(latencies, 50), percentile(latencies, 95)
+
+    return {
+        "status": job["status"],
+        "pages_total": int(job["pages_total"]),
+        "pages_done": int(job["pages_done"]),
+        "pages_failed": int(job.get("pages_failed", 0)),
+        "corps_fetched": int(job["corps_fetched"]),
+        "failures": int(job["failures"]),
+        "requests": requests_made,
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(requests_made / elapsed, 3),
+        "latency_p50_ms": None if p50 is None else round(p50 * 1000, 1),
+        "latency_p95_ms": None if p95 is None else round(p95 * 1000, 1),
+        "error": job.get("error") or None,
+    }
@@ -1,36 +1,31 @@
+import uuid
 from fastapi import FastAPI
-from tasks import get_corp_list
-from celery import group
-
+from tasks import start_crawl
+from jobs import create_job, job_status
 
 app = FastAPI()
 
 CORP_DATA_PATH = "corp_data.json"
 
-PAGE_RANGE = list(range(1, 28))
-
-batch_results = {}
-
 
 @app.get("/crawl")
-def crawl():
-    batch_task = group(get_corp_list.s(page) for page in PAGE_RANGE)
-
-    result = batch_task.apply_async()
+def crawl(incremental: bool = False):
+    job_id = str(uuid.uuid4())
+    create_job(job_id)
 
-    batch_results[result.id] = result
+    start_crawl.delay(job_id, incremental=incremental)
 
-    return {"status": "Batch process initiated", "batch_id": result.id}
+    return {
+        "status": "Batch process initiated",
+        "batch_id": job_id,
+    }
 
 
 @app.get("/status/{batch_id}")
 def status(batch_id):
-    result = batch_results.get(batch_id)
+    job = job_status(batch_id)
 
-    if not result:
+    if not job:
         return {"status": "Invalid batch ID or batch does not exist"}
 
-    if result.ready():
-        return {"status": "Batch processing completed"}
-    else:
-        return {"status": "Batch processing in progress, please come back later"}
+    return job
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import os
+import time
+from constants import DATA_DIR, MANIFEST_DIR, MAX_AGE
+
+
+def content_hash(corp):
+    """
+    Stable hash of a corporate record, independent of key order.
+    """
+    encoded = json.dumps(corp, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def shard_path(page):
+    return os.path.join(DATA_DIR, f"corp_{page}.json")
+
+
+def manifest_path(page):
+    return os.path.join(MANIFEST_DIR, f"page_{page}.json")
+
+
+def load_manifest(page):
+    """
+    Returns {corp_id: {"hash", "fetched_at"}} for a page.
+
+    There is one manifest per page, so chord callbacks of different
+    pages never write the same file. A manifest without its shard
+    is ignored, since its records are gone.
+    """
+    if not os.path.exists(shard_path(page)):
+        return {}
+    try:
+        with open(manifest_path(page), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(page, entries):
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    path = manifest_path(page)
+    with open(path + ".tmp", "w") as f:
+        json.dump(entries, f)
+    os.replace(path + ".tmp", path)
+
+
+def manifest_entries(corps, fetched_at=None):
+    fetched_at = fetched_at or time.time()
+    return {
+        corp["id"]: {"hash": content_hash(corp), "fetched_at": fetched_at}
+        for corp in corps
+    }
+
+
+def ids_to_refresh(page, corp_ids, max_age=MAX_AGE, now=None):
+    """
+    Returns the ids of a page that are new or older than max_age.
+    """
+    manifest = load_manifest(page)
+    now = now or time.time()
+    return [
+        corp_id
+        for corp_id in corp_ids
+        if corp_id not in manifest or now - manifest[corp_id]["fetched_at"] > max_age
+    ]
+
+
+def merge_shard(page, page_ids, refreshed):
+    """
+    Merges refreshed records into a page's shard.
+
+    The shard keeps the page's current id order, drops ids that left the
+    page and is only rewritten when a record's content hash or the page's
+    membership changed. The manifest always gets the new fetch times.
+    Returns whether the shard was rewritten.
+    """
+    manifest = load_manifest(page)
+    existing = {}
+    if manifest:
+        with open(shard_path(page), "r", encoding="utf-8") as f:
+            existing = {corp["id"]: corp for corp in json.load(f)}
+
+    fetched = manifest_entries(refreshed)
+    refreshed = {corp["id"]: corp for corp in refreshed}
+
+    # Membership, not order: batch retries can leave a shard out of page order.
+    changed = set(existing) != set(page_ids)
+    for corp_id, entry in fetched.items():
+        if manifest.get(corp_id, {}).get("hash") != entry["hash"]:
+            changed = True
+
+    records = []
+    entries = {}
+    for corp_id in page_ids:
+        if corp_id in refreshed:
+            records.append(refreshed[corp_id])
+            entries[corp_id] = fetched[corp_id]
+        elif corp_id in existing:
+            records.append(existing[corp_id])
+            entries[corp_id] = (
+                manifest.get(corp_id) or manifest_entries([existing[corp_id]])[corp_id]
+            )
+        else:
+            changed = True
+
+    if changed:
+        with open(shard_path(page) + ".tmp", "w") as f:
+            json.dump(records, f, indent=2)
+        os.replace(shard_path(page) + ".tmp", shard_path(page))
+
+    save_manifest(page, entries)
+    return changed
@@ -0,0 +1,85 @@
+import logging
+from constants import CORP_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+def corp_batch_payload(corp_ids):
+    """
+    Builds one GraphQL request for several corporates.
+
+    Every id gets its own aliased field, `c0: corporate(id: $id0)`,
+    so the response maps back to the ids by position.
+    """
+    variables = ", ".join(f"$id{i}: String!" for i in range(len(corp_ids)))
+    fields = "\n".join(
+        f"  c{i}: corporate(id: $id{i}) {CORP_FIELDS}" for i in range(len(corp_ids))
+    )
+
+    return {
+        "query": f"query ({variables}) {{\n{fields}\n}}",
+        "variables": {f"id{i}": corp_id for i, corp_id in enumerate(corp_ids)},
+    }
+
+
+def split_batch_response(corp_ids, response):
+    """
+    Splits a batched response into found corporates and failed ids.
+
+    An id fails when its alias is listed in `errors`, or when the whole
+    response carries errors without a path to a single alias. Ids that
+    come back null without an error do not exist and are dropped.
+    """
+    data = response.get("data") or {}
+    errors = response.get("errors") or []
+
+    failed_aliases = set()
+    for error in errors:
+        path = error.get("path") or []
+        if not path:
+            return [], list(corp_ids)
+        failed_aliases.add(path[0])
+
+    corps, failed = [], []
+    for i, corp_id in enumerate(corp_ids):
+        alias = f"c{i}"
+        if alias in failed_aliases:
+            failed.append(corp_id)
+        elif data.get(alias) is None:
+            logger.warning(f"Corporate {corp_id} not found, skipping")
+        else:
+            corps.append(data[alias])
+
+    return corps, failed
+
+
+def retry_batches(corp_ids, failed):
+    """
+    Returns the batches to request again after a batch had failed ids.
+
+    Ids that errored inside an otherwise good response are retried
+    together, and a batch that failed as a whole is bisected. A single
+    id that failed on its own gets no retry, so callers skip it.
+    """
+    if not failed or len(corp_ids) == 1:
+        return []
+    if len(failed) < len(corp_ids):
+        return [failed]
+    mid = len(failed) // 2
+    return [failed[:mid], failed[mid:]]
+
+
+def in_id_order(corp_ids, corps):
+    """
+    Sorts fetched corporates back into the order of corp_ids.
+    """
+    position = {corp_id: i for i, corp_id in enumerate(corp_ids)}
+    return sorted(corps, key=lambda corp: position[corp["id"]])
+
+
+def chunks(items, size):
+    """
+    Splits a list into consecutive slices of at most `size` items.
+    """
+    size = max(1, size)
+    return [items[i : i + size] for i in range(0, len(items), size)]
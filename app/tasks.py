@@ -1,58 +1,424 @@
 from celery import Celery, group, chord
+from celery.signals import worker_process_init
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import glob, os
-from constants import ENDPOINT, LIST_CORP_PAYLOAD, CORP_BY_ID_PAYLOAD
+import shutil
+import logging
+import time
+from functools import partial
+from constants import (
+    ENDPOINT,
+    list_corp_payload,
+    corp_by_id_payload,
+    BATCH_SIZE,
+    CHUNK_SIZE,
+    CHUNK_CONCURRENCY,
+    PAGE_WINDOW,
+    MAX_PAGES,
+    MAX_RETRIES,
+    BACKOFF_BASE,
+    BACKOFF_CAP,
+    REQUEST_TIMEOUT,
+    RETRY_STATUSES,
+    SPOOL,
+    SPOOL_DIR,
+)
+from jobs import (
+    start_job,
+    fail_job,
+    record_request,
+    record_corps,
+    record_failures,
+    record_page_done,
+)
+from queries import (
+    corp_batch_payload,
+    split_batch_response,
+    retry_batches,
+    in_id_order,
+    chunks,
+)
+from manifest import (
+    shard_path,
+    save_manifest,
+    manifest_entries,
+    ids_to_refresh,
+    merge_shard,
+)
+
+logger = logging.getLogger(__name__)
 
 app = Celery("tasks", broker="redis://redis:6379/0", backend="redis://redis:6379/1")
-session = requests.Session()
+
+_session = None
+_session_pid = None
+
+
+def make_session():
+    """
+    Pooled session with retries on 429/5xx and jittered backoff.
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=BACKOFF_BASE,
+        backoff_max=BACKOFF_CAP,
+        backoff_jitter=BACKOFF_BASE,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_maxsize=max(CHUNK_CONCURRENCY, PAGE_WINDOW), max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
-def post_request(payload, endpoint=ENDPOINT):
+def get_session():
+    """
+    Returns this process' session.
+
+    Prefork workers inherit the parent's module state, so the session
+    is created per process instead of shared across the fork.
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        _session = make_session()
+        _session_pid = os.getpid()
+    return _session
+
+
+@worker_process_init.connect
+def init_worker_session(**kwargs):
+    get_session()
+
+
+def post_request(payload, endpoint=ENDPOINT, job_id=None):
     """
     General post_request form.
 
     Returns response.json if status=200
     Raises the status otherwise.
+    Records the request's latency on the crawl job, if there is one.
     """
-    response = session.post(endpoint, json=payload)
+    start = time.perf_counter()
+    try:
+        response = get_session().post(endpoint, json=payload, timeout=REQUEST_TIMEOUT)
+    finally:
+        record_request(job_id, time.perf_counter() - start)
     response.raise_for_status()
     return response.json()
 
 
+def list_page_ids(page, job_id=None):
+    """
+    Returns the corporate ids on a page.
+    """
+    data = post_request(list_corp_payload(page), job_id=job_id)
+    return [id["id"] for id in data["data"]["corporates"]["rows"]]
+
+
+def probe_page(page, job_id=None):
+    """
+    Returns the corporate ids on a page, or None if listing it failed
+    after the session's retries.
+    """
+    try:
+        return list_page_ids(page, job_id)
+    except (requests.RequestException, KeyError, TypeError) as e:
+        logger.warning(f"Probing page {page} failed: {e}")
+        return None
+
+
+def discover_pages(window=PAGE_WINDOW, max_pages=MAX_PAGES, job_id=None):
+    """
+    Finds the non-empty pages and their ids.
+
+    Probes `window` pages at a time concurrently and stops at the first
+    page with empty rows. Returns {page: corp_ids}. A page whose probe
+    failed maps to None, so its page task lists it again. Raises when a
+    whole window fails.
+    """
+    pages = {}
+    start = 1
+
+    with ThreadPoolExecutor(window) as pool:
+        while start <= max_pages:
+            probe = range(start, min(start + window, max_pages + 1))
+            results = list(pool.map(partial(probe_page, job_id=job_id), probe))
+            if all(corp_ids is None for corp_ids in results):
+                raise RuntimeError(f"Probing pages {probe[0]}-{probe[-1]} failed")
+            for page, corp_ids in zip(probe, results):
+                if corp_ids == []:
+                    return pages
+                pages[page] = corp_ids
+            start += window
+
+    logger.warning(f"Stopped page discovery at MAX_PAGES={max_pages}")
+    return pages
+
+
 @app.task
-def get_corp_list(page, payload=LIST_CORP_PAYLOAD):
+def start_crawl(job_id, incremental=False):
+    """
+    Discovers the pages, then starts one get_corp_list task per page.
+    Runs on a worker, so the /crawl request does not wait for discovery.
+    """
+    try:
+        pages = discover_pages(job_id=job_id)
+    except Exception as e:
+        fail_job(job_id, f"Page discovery failed: {e}")
+        raise
+    start_job(job_id, len(pages))
+
+    group(
+        get_corp_list.s(page, incremental=incremental, page_ids=corp_ids, job_id=job_id)
+        for page, corp_ids in pages.items()
+    ).apply_async()
+    return len(pages)
+
+
+def fetch_corp_batch(corp_ids, job_id=None):
+    """
+    Fetches several corporates with one batched request.
+
+    Failed ids are requested again as retry_batches splits them, so one
+    bad id only costs itself. Ids that keep failing alone are logged and
+    skipped. Records come back in the order of corp_ids.
+    """
+    reason = "errored inside batch"
+    try:
+        response = post_request(corp_batch_payload(corp_ids), job_id=job_id)
+        corps, failed = split_batch_response(corp_ids, response)
+    except requests.RequestException as e:
+        reason = str(e)
+        corps, failed = [], list(corp_ids)
+
+    batches = retry_batches(corp_ids, failed)
+    if failed and not batches:
+        logger.error(f"Corporate {failed[0]} failed, skipping: {reason}")
+        record_failures(job_id)
+
+    for batch in batches:
+        corps += fetch_corp_batch(batch, job_id)
+    return in_id_order(corp_ids, corps)
+
+
+def spool_records(page, name, corps):
+    """
+    Writes records as NDJSON to the page's spool directory.
+    Returns a small reference for the result backend.
+    """
+    page_dir = os.path.join(SPOOL_DIR, f"page_{page}")
+    os.makedirs(page_dir, exist_ok=True)
+
+    path = os.path.join(page_dir, f"{name}.ndjson")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for corp in corps:
+            f.write(json.dumps(corp) + "\n")
+    os.replace(tmp_path, path)
+
+    return {"path": path, "count": len(corps)}
+
+
+def read_spool(refs):
+    """
+    Yields the records of spooled result references.
+    """
+    for ref in refs:
+        with open(ref["path"], "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def clear_spool(page):
+    shutil.rmtree(os.path.join(SPOOL_DIR, f"page_{page}"), ignore_errors=True)
+
+
+def finalize_shard(page, refs):
+    """
+    Streams a page's spooled records into its shard,
+    then removes the spool files.
+    """
+    filename = shard_path(page)
+    tmp_filename = filename + ".tmp"
+
+    entries = {}
+    with open(tmp_filename, "w", encoding="utf-8") as out:
+        out.write("[")
+        for corp in read_spool(refs):
+            out.write(",\n" if entries else "\n")
+            out.write(json.dumps(corp, indent=2))
+            entries.update(manifest_entries([corp]))
+        out.write("\n]")
+    os.replace(tmp_filename, filename)
+
+    save_manifest(page, entries)
+    clear_spool(page)
+    return len(entries)
+
+
+@app.task
+def get_corp_list(
+    page,
+    chunk_size=CHUNK_SIZE,
+    batch_size=BATCH_SIZE,
+    spool=SPOOL,
+    incremental=False,
+    page_ids=None,
+    job_id=None,
+):
     """
     Fetches data for a specific page.
     Creates a group of tasks to receive and write data.
+
+    Each task fetches chunk_size corporates, batch_size per request.
+    With both set to 1, there is one task and one request per corporate.
+    In spool mode, chunk tasks write their records to disk themselves.
+    In incremental mode, only new and stale corporates are fetched
+    and merged into the existing shard.
+    Ids already known from page discovery can be passed as page_ids.
+    Progress is recorded on the crawl job job_id.
     """
 
-    payload["variables"]["page"] = page
-    data = post_request(payload)
-    corp_ids = data["data"]["corporates"]["rows"]
+    if page_ids is None:
+        try:
+            page_ids = list_page_ids(page, job_id)
+        except requests.RequestException:
+            record_failures(job_id)
+            record_page_done(job_id, failed=True)
+            raise
+        if not page_ids:
+            # Past the last page, its discovery probe had failed.
+            record_page_done(job_id)
+            return None
+    corp_ids = page_ids
 
-    return chord((get_corp_data.s(id["id"]) for id in corp_ids))(
-        on_batch_complete.s(page)
-    )
+    errback = on_page_failed.s(page, job_id)
+
+    if incremental:
+        corp_ids = ids_to_refresh(page, page_ids)
+        if not corp_ids:
+            return on_batch_complete.apply_async(
+                ([], page, page_ids, job_id), link_error=errback
+            )
+
+    callback = on_batch_complete.s(page, page_ids if incremental else None, job_id)
+    # Called when a header task or the callback itself fails.
+    callback.link_error(errback)
+
+    if spool or chunk_size > 1 or batch_size > 1:
+        header = (
+            get_corp_chunk.s(chunk, batch_size, page if spool else None, job_id)
+            for chunk in chunks(corp_ids, max(chunk_size, batch_size))
+        )
+    else:
+        header = (get_corp_data.s(corp_id, job_id) for corp_id in corp_ids)
+
+    return chord(header)(callback)
 
 
 @app.task
-def get_corp_data(corp_id, payload=CORP_BY_ID_PAYLOAD):
+def get_corp_data(corp_id, job_id=None):
     """
     Returns the corp data using corp's id.
     """
-    payload["variables"]["id"] = corp_id
-    data = post_request(payload)
+    try:
+        data = post_request(corp_by_id_payload(corp_id), job_id=job_id)
+    except requests.RequestException:
+        record_failures(job_id)
+        raise
+    record_corps(job_id, 1)
     return data["data"]["corporate"]
 
 
+@app.task(bind=True)
+def get_corp_chunk(self, corp_ids, batch_size=BATCH_SIZE, spool_page=None, job_id=None):
+    """
+    Returns the corp data for a slice of ids.
+
+    Fetches batch_size corporates per request, with up to
+    CHUNK_CONCURRENCY requests in flight on the worker's session.
+    With spool_page set, writes the records to the spool instead
+    and returns only their path and count.
+    """
+    batches = chunks(corp_ids, batch_size)
+    if len(batches) == 1:
+        corps = fetch_corp_batch(batches[0], job_id)
+    else:
+        with ThreadPoolExecutor(min(CHUNK_CONCURRENCY, len(batches))) as pool:
+            results = pool.map(partial(fetch_corp_batch, job_id=job_id), batches)
+            corps = [corp for result in results for corp in result]
+    record_corps(job_id, len(corps))
+
+    if spool_page is not None:
+        return spool_records(spool_page, self.request.id, corps)
+    return corps
+
+
 @app.task
-def on_batch_complete(results, page):
+def on_batch_complete(results, page, page_ids=None, job_id=None):
     """
     Callback to get_corp_list's chord.
-    Writes the result on a file.
+    Writes the result on a file and marks the page done on the job.
+    """
+    result = write_page(results, page, page_ids)
+    record_page_done(job_id)
+    return result
+
+
+@app.task
+def on_page_failed(request, exc, traceback, page, job_id=None):
     """
-    filename = f"./data/corp_{page}.json"
+    Error callback of a page's chord, when one of its tasks or the
+    shard write failed. Marks the page done and failed on the job.
+    """
+    logger.error(f"Page {page} failed: {exc}")
+    record_page_done(job_id, failed=True)
+
+
+def write_page(results, page, page_ids=None):
+    """
+    Writes a page's chord results to its shard.
+
+    Spooled results are only references, the records are
+    streamed from the spool files into the shard.
+    With page_ids set, the results are merged into the existing shard.
+    """
+    spooled = bool(results) and all(
+        isinstance(result, dict) and "path" in result for result in results
+    )
+
+    if spooled and page_ids is None:
+        count = finalize_shard(page, results)
+        return {"page": page, "count": count}
+
+    if spooled:
+        results = list(read_spool(results))
+    else:
+        results = [
+            corp
+            for result in results
+            for corp in (result if isinstance(result, list) else [result])
+            if corp is not None
+        ]
+
+    if page_ids is not None:
+        changed = merge_shard(page, page_ids, results)
+        clear_spool(page)
+        return {"page": page, "refreshed": len(results), "changed": changed}
+
+    filename = shard_path(page)
 
     with open(filename, "w") as f:
         json.dump(results, f, indent=2)
+    save_manifest(page, manifest_entries(results))
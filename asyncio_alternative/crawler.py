@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+
+from constants import (
+    ENDPOINT,
+    CONCURRENCY,
+    RATE_LIMIT,
+    RATE_BURST,
+    MAX_RETRIES,
+    BACKOFF_BASE,
+    BACKOFF_CAP,
+    REQUEST_TIMEOUT,
+    RETRY_STATUSES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class RetryableError(Exception):
+    """
+    Raised for responses worth another attempt (429/5xx).
+    Carries the server's Retry-After hint when there is one.
+    """
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"Retryable HTTP status {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter.
+
+    Refills at `rate` tokens per second up to `capacity`,
+    each request takes one token.
+    """
+
+    def __init__(self, rate=RATE_LIMIT, capacity=RATE_BURST):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class Crawler:
+    """
+    Shared crawl engine.
+
+    One pooled aiohttp session for the whole run, at most `concurrency`
+    requests in flight, a token-bucket rate limit and jittered exponential
+    backoff on 429/5xx and connection errors.
+
+    Use as an async context manager:
+
+        async with Crawler() as crawler:
+            data = await crawler.post(payload)
+    """
+
+    def __init__(
+        self,
+        endpoint=ENDPOINT,
+        concurrency=CONCURRENCY,
+        rate=RATE_LIMIT,
+        burst=RATE_BURST,
+        max_retries=MAX_RETRIES,
+        backoff_base=BACKOFF_BASE,
+        backoff_cap=BACKOFF_CAP,
+        timeout=REQUEST_TIMEOUT,
+    ):
+        self.endpoint = endpoint
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=self.timeout
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+        self.session = None
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Full-jitter exponential backoff, never shorter than Retry-After.
+        """
+        delay = random.uniform(
+            0, min(self.backoff_cap, self.backoff_base * 2**attempt)
+        )
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def _send(self, payload):
+        async with self.semaphore:
+            await self.bucket.acquire()
+            async with self.session.post(self.endpoint, json=payload) as response:
+                if response.status in RETRY_STATUSES:
+                    retry_after = response.headers.get("Retry-After")
+                    try:
+                        retry_after = float(retry_after)
+                    except (TypeError, ValueError):
+                        retry_after = None
+                    raise RetryableError(response.status, retry_after)
+
+                response.raise_for_status()
+                return await response.json()
+
+    async def post(self, payload):
+        """
+        Posts the payload and returns response.json.
+
+        Retries 429/5xx, timeouts and connection errors up to `max_retries`
+        times, raises the last error after that. Other HTTP errors are
+        raised immediately.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self._send(payload)
+            except RetryableError as e:
+                error, retry_after = e, e.retry_after
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error, retry_after = e, None
+
+            if attempt == self.max_retries:
+                raise error
+
+            delay = self.backoff(attempt, retry_after)
+            logger.warning(
+                f"Request failed ({error}), retry {attempt + 1}/{self.max_retries} "
+                f"in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
@@ -1,55 +1,206 @@
 import json
 import asyncio
-import aiohttp
+import logging
 import sys
 import os
-import json
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
-from constants import ENDPOINT, LIST_CORP_PAYLOAD, CORP_BY_ID_PAYLOAD
-
-PAGE_RANGE = list(range(1, 28))
-
-
-async def post_request(session, payload, endpoint=ENDPOINT):
-    async with session.post(endpoint, json=payload) as response:
-        response.raise_for_status()
-        return await response.json()
-
-
-async def get_corp_list(session, page, payload=LIST_CORP_PAYLOAD):
-    payload["variables"]["page"] = page
-    data = await post_request(session, payload)
+from constants import (
+    list_corp_payload,
+    corp_by_id_payload,
+    CONCURRENCY,
+    BATCH_SIZE,
+    PAGE_WINDOW,
+    MAX_PAGES,
+)
+from queries import (
+    corp_batch_payload,
+    split_batch_response,
+    retry_batches,
+    in_id_order,
+)
+from crawler import Crawler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+OUTPUT_PATH = os.getenv("CRAWL_OUTPUT", "corp_data.ndjson")
+SHARD_SIZE = int(os.getenv("CRAWL_SHARD_SIZE", 0))  # records per file, 0 = one file
+QUEUE_SIZE = CONCURRENCY * 4
+
+
+async def get_corp_list(crawler, page):
+    data = await crawler.post(list_corp_payload(page))
     corp_ids = data["data"]["corporates"]["rows"]
     return corp_ids
 
 
-async def get_corp(session, corp_id, payload=CORP_BY_ID_PAYLOAD):
-    payload["variables"]["id"] = corp_id
-    data = await post_request(session, payload)
+async def get_corp(crawler, corp_id):
+    data = await crawler.post(corp_by_id_payload(corp_id))
     return data["data"]["corporate"]
 
 
-async def fetch_all_pages(pages=PAGE_RANGE):
-    async with aiohttp.ClientSession() as session:
-        tasks = [get_corp_list(session, page) for page in pages]
-        results = await asyncio.gather(*tasks)
-        flat = [corp["id"] for sublist in results for corp in sublist]
-        return flat
-
-
-async def fetch_corps(ids):
-    async with aiohttp.ClientSession() as session:
-        tasks = [get_corp(session, corp_id) for corp_id in ids]
-        results = await asyncio.gather(*tasks)
-        return results
-
-
-async def main():
-    corp_ids = await fetch_all_pages()
-    res = await fetch_corps(corp_ids)
-    with open("corp_data.json", "w") as f:
-        f.write(json.dumps(res, indent=2))
+async def get_corp_batch(crawler, corp_ids):
+    """
+    Fetches several corporates with one batched request.
+
+    Failed ids are requested again as retry_batches splits them, the
+    same way the Celery crawler does. Ids that keep failing alone are
+    logged and skipped. Records come back in the order of corp_ids.
+    """
+    reason = "errored inside batch"
+    try:
+        response = await crawler.post(corp_batch_payload(corp_ids))
+        corps, failed = split_batch_response(corp_ids, response)
+    except Exception as e:
+        reason = str(e)
+        corps, failed = [], list(corp_ids)
+
+    batches = retry_batches(corp_ids, failed)
+    if failed and not batches:
+        logger.error(f"Corporate {failed[0]} failed, skipping: {reason}")
+
+    retried = await asyncio.gather(
+        *(get_corp_batch(crawler, batch) for batch in batches)
+    )
+    for batch_corps in retried:
+        corps += batch_corps
+    return in_id_order(corp_ids, corps)
+
+
+class NDJSONSink:
+    """
+    Append-only NDJSON writer, one corporate per line.
+
+    With `shard_size` set, rolls over to `<stem>.<n>.ndjson`
+    every `shard_size` records.
+    """
+
+    def __init__(self, path=OUTPUT_PATH, shard_size=SHARD_SIZE):
+        self.path = path
+        self.shard_size = shard_size
+        self.shard = 0
+        self.count = 0
+        self.file = None
+
+    def _shard_path(self):
+        if not self.shard_size:
+            return self.path
+        stem, ext = os.path.splitext(self.path)
+        return f"{stem}.{self.shard}{ext}"
+
+    def write(self, record):
+        if self.file is None:
+            self.file = open(self._shard_path(), "w", encoding="utf-8")
+
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.count += 1
+
+        if self.shard_size and self.count % self.shard_size == 0:
+            self.file.close()
+            self.file = None
+            self.shard += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+async def produce_ids(crawler, queue, window=PAGE_WINDOW, max_pages=MAX_PAGES):
+    """
+    Discovers pages and queues each page's ids as soon as it arrives.
+
+    Probes `window` pages at a time concurrently and stops after the
+    window that holds the first page with empty rows.
+    """
+    seen = set()
+    exhausted = False
+
+    async def produce_page(page):
+        nonlocal exhausted
+        try:
+            rows = await get_corp_list(crawler, page)
+        except Exception as e:
+            logger.error(f"Page {page} failed: {e}")
+            return
+
+        if not rows:
+            exhausted = True
+            return
+
+        for corp in rows:
+            if corp["id"] not in seen:
+                seen.add(corp["id"])
+                await queue.put(corp["id"])
+
+    start = 1
+    while not exhausted and start <= max_pages:
+        probe = range(start, min(start + window, max_pages + 1))
+        await asyncio.gather(*(produce_page(page) for page in probe))
+        start += window
+
+    logger.info(f"Discovered {len(seen)} corporates")
+
+
+async def consume_ids(crawler, queue, sink, batch_size=BATCH_SIZE):
+    """
+    Fetches details for queued ids and streams them to the sink.
+
+    Takes whatever is queued, up to batch_size ids, for one batched
+    request. Stops on a None sentinel.
+    """
+    while True:
+        corp_id = await queue.get()
+        if corp_id is None:
+            return
+
+        corp_ids, done = [corp_id], False
+        while len(corp_ids) < batch_size and not queue.empty():
+            corp_id = queue.get_nowait()
+            if corp_id is None:
+                done = True
+                break
+            corp_ids.append(corp_id)
+
+        if batch_size > 1:
+            corps = await get_corp_batch(crawler, corp_ids)
+        else:
+            try:
+                corps = [await get_corp(crawler, corp_ids[0])]
+            except Exception as e:
+                logger.error(f"Corporate {corp_ids[0]} failed: {e}")
+                corps = []
+
+        for corp in corps:
+            sink.write(corp)
+
+        if done:
+            return
+
+
+async def main(path=OUTPUT_PATH, workers=CONCURRENCY):
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    with NDJSONSink(path) as sink:
+        async with Crawler() as crawler:
+            consumers = [
+                asyncio.create_task(consume_ids(crawler, queue, sink))
+                for _ in range(workers)
+            ]
+            await produce_ids(crawler, queue)
+
+            for _ in consumers:
+                await queue.put(None)
+            await asyncio.gather(*consumers)
+
+    logger.info(f"Wrote {sink.count} corporates to {path}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+"""
+Offline stand-in for the ranking GraphQL endpoint.
+
+Serves `corporates(page)` and `corporate(id)`, including aliased batches,
+replayed from the agent/data/corp_*.json shards, with configurable
+latency, jitter and error injection.
+
+    python mock_server.py --port 8001 --latency 0.1 --jitter 0.05
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import re
+import time
+
+from aiohttp import web
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "agent", "data")
+
+CORPORATE_FIELD = re.compile(r"(?:(\w+)\s*:\s*)?corporate\(\s*id:\s*\$(\w+)\s*\)")
+
+
+def load_shards(data_dir=DATA_DIR):
+    """
+    Returns ({page: [ids]}, {id: corp}) from the corp_{page}.json shards.
+    """
+    pages, corps = {}, {}
+    for path in glob.glob(os.path.join(data_dir, "corp_*.json")):
+        page = int(re.search(r"corp_(\d+)\.json$", path).group(1))
+        with open(path, "r", encoding="utf-8") as f:
+            shard = json.load(f)
+        pages[page] = [corp["id"] for corp in shard]
+        corps.update((corp["id"], corp) for corp in shard)
+    return pages, corps
+
+
+class MockGraphQL:
+    """
+    Request handler with latency, jitter and error injection.
+
+    error_rate fails whole requests with HTTP 503,
+    id_error_rate fails single corporates inside a response
+    with a GraphQL error on their alias.
+    """
+
+    def __init__(
+        self,
+        data_dir=DATA_DIR,
+        latency=0.05,
+        jitter=0.02,
+        error_rate=0.0,
+        id_error_rate=0.0,
+        seed=None,
+    ):
+        self.pages, self.corps = load_shards(data_dir)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.id_error_rate = id_error_rate
+        self.random = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.errors = 0
+        self.service_times = []
+
+    async def handle(self, request):
+        start = time.perf_counter()
+        self.requests += 1
+        body = await request.json()
+
+        await asyncio.sleep(
+            max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        )
+
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            response = web.Response(status=503)
+        else:
+            response = web.json_response(self.resolve(body))
+
+        self.service_times.append(time.perf_counter() - start)
+        return response
+
+    def resolve(self, body):
+        query, variables = body["query"], body.get("variables") or {}
+
+        if "corporates(" in query:
+            rows = self.pages.get(variables.get("page"), [])
+            return {"data": {"corporates": {"rows": [{"id": id} for id in rows]}}}
+
+        data, errors = {}, []
+        for alias, variable in CORPORATE_FIELD.findall(query):
+            alias = alias or "corporate"
+            if self.random.random() < self.id_error_rate:
+                self.errors += 1
+                data[alias] = None
+                errors.append({"message": "Injected error", "path": [alias]})
+            else:
+                data[alias] = self.corps.get(variables.get(variable))
+
+        response = {"data": data}
+        if errors:
+            response["errors"] = errors
+        return response
+
+    async def stats(self, request):
+        return web.json_response(
+            {
+                "requests": self.requests,
+                "errors": self.errors,
+                "service_times": self.service_times,
+            }
+        )
+
+    async def handle_reset(self, request):
+        self.reset()
+        return web.json_response({"status": "reset"})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post("/graphql", self.handle)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_post("/reset", self.handle_reset)
+        return app
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--id-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(args)
+
+
+def make_server(args):
+    return MockGraphQL(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        id_error_rate=args.id_error_rate,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    web.run_app(make_server(args).app(), host=args.host, port=args.port)
@@ -0,0 +1,214 @@
+"""
+Crawler benchmark against the offline GraphQL stand-in.
+
+Starts mock_server.py in-process, runs each crawl path in its own
+subprocess and reports throughput, request latency and peak memory.
+
+    python run.py --latency 0.1 --jitter 0.05 --error-rate 0.01
+"""
+
+import asyncio
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from aiohttp import web
+
+from mock_server import parse_args as parse_server_args, make_server
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+APP_DIR = os.path.join(ROOT, "app")
+ASYNCIO_DIR = os.path.join(ROOT, "asyncio_alternative")
+
+PATHS = ("asyncio", "celery")
+
+# Client-side request latencies of the running path, in seconds.
+LATENCIES = []
+
+
+def timed(post):
+    """
+    Wraps a crawler's post function to record its latency as the
+    crawler sees it: pool and rate-limit waits, retries and backoff
+    sleeps included.
+    """
+    if asyncio.iscoroutinefunction(post):
+
+        async def timed_post(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await post(*args, **kwargs)
+            finally:
+                LATENCIES.append(time.perf_counter() - start)
+
+    else:
+
+        def timed_post(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return post(*args, **kwargs)
+            finally:
+                LATENCIES.append(time.perf_counter() - start)
+
+    return timed_post
+
+
+def run_asyncio(output_dir):
+    """
+    The asyncio pipeline, writing NDJSON into output_dir.
+    """
+    sys.path[:0] = [ASYNCIO_DIR, APP_DIR]
+    import main as crawl
+    from crawler import Crawler
+
+    Crawler.post = timed(Crawler.post)
+
+    path = os.path.join(output_dir, "corp_data.ndjson")
+    asyncio.run(crawl.main(path=path))
+
+    with open(path, "r", encoding="utf-8") as f:
+        return sum(1 for _ in f)
+
+
+def run_celery(output_dir):
+    """
+    The Celery tasks, executed eagerly in this process.
+
+    Measures the tasks' HTTP, batching and file work,
+    but not broker or result-backend round trips.
+    """
+    sys.path.insert(0, APP_DIR)
+    import tasks
+
+    tasks.post_request = timed(tasks.post_request)
+    tasks.app.conf.task_always_eager = True
+    tasks.app.conf.task_eager_propagates = True
+
+    for page, corp_ids in tasks.discover_pages().items():
+        tasks.get_corp_list.apply(args=(page,), kwargs={"page_ids": corp_ids})
+
+    count = 0
+    for path in glob.glob(os.path.join(output_dir, "corp_*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            count += len(json.load(f))
+    return count
+
+
+def child(path):
+    """
+    Runs one crawl path and prints its measurements as JSON.
+    """
+    output_dir = os.environ["CRAWL_DATA_DIR"]
+    start = time.perf_counter()
+    corps = {"asyncio": run_asyncio, "celery": run_celery}[path](output_dir)
+    elapsed = time.perf_counter() - start
+
+    print(
+        json.dumps(
+            {
+                "corps": corps,
+                "seconds": elapsed,
+                "latencies": LATENCIES,
+                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                / 1024,
+            }
+        )
+    )
+
+
+def serve(server, host, port):
+    """
+    Runs the mock server on its own event loop in a daemon thread.
+    """
+    ready = threading.Event()
+
+    async def start():
+        runner = web.AppRunner(server.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=lambda: asyncio.run(start()), daemon=True).start()
+    ready.wait()
+
+
+def http(url, method="GET"):
+    request = urllib.request.Request(url, method=method)
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+def benchmark(path, base_url):
+    """
+    Runs one path in a subprocess and combines its numbers
+    with the server's request statistics. Latency is measured by the
+    crawler, per request including its retries, not by the server.
+    """
+    http(f"{base_url}/reset", method="POST")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        env = {
+            **os.environ,
+            "CRAWL_ENDPOINT": f"{base_url}/graphql",
+            "CRAWL_DATA_DIR": output_dir,
+            "CRAWL_SPOOL_DIR": os.path.join(output_dir, "spool"),
+        }
+        result = subprocess.run(
+            [sys.executable, __file__, "--child", path],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+
+    stats = http(f"{base_url}/stats")
+    times = [t * 1000 for t in measured["latencies"]]
+    seconds = measured["seconds"]
+
+    return {
+        "path": path,
+        "corps": measured["corps"],
+        "seconds": round(seconds, 3),
+        "corps_per_second": round(measured["corps"] / seconds, 1),
+        "requests": stats["requests"],
+        "requests_per_second": round(stats["requests"] / seconds, 1),
+        "injected_errors": stats["errors"],
+        "latency_p50_ms": round(percentile(times, 50), 1),
+        "latency_p95_ms": round(percentile(times, 95), 1),
+        "latency_p99_ms": round(percentile(times, 99), 1),
+        "peak_rss_mb": round(measured["peak_rss_mb"], 1),
+    }
+
+
+def main(argv):
+    paths = [arg for arg in argv if arg in PATHS] or list(PATHS)
+    args = parse_server_args([arg for arg in argv if arg not in PATHS])
+
+    serve(make_server(args), args.host, args.port)
+    base_url = f"http://{args.host}:{args.port}"
+
+    results = [benchmark(path, base_url) for path in paths]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(sys.argv[2])
+    else:
+        main(sys.argv[1:])
@@ -0,0 +1,35 @@
+import json
+import os
+import sys
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# The agent and the crawlers import their modules flat, from their own
+# directories.
+sys.path[:0] = [
+    os.path.join(ROOT, "agent"),
+    os.path.join(ROOT, "app"),
+    os.path.join(ROOT, "asyncio_alternative"),
+]
+
+REQUIRED_FIELDS = ("name", "description", "hq_city", "hq_country")
+
+
+@pytest.fixture(scope="session")
+def corps():
+    """
+    Corporates of the first crawl shards, with the fields and themes
+    preprocessing keeps.
+    """
+    corps = []
+    for page in (1, 2, 3):
+        with open(os.path.join(ROOT, "agent", "data", f"corp_{page}.json")) as f:
+            for corp in json.load(f):
+                if None in (corp.get(key) for key in REQUIRED_FIELDS):
+                    continue
+                corp["themes"] = sorted(
+                    {theme for theme, _ in corp["startup_themes"] if theme != "Other"}
+                )
+                corps.append(corp)
+    return corps
@@ -0,0 +1,106 @@
+import asyncio
+import importlib.util
+import os
+import pytest
+import requests
+import tasks
+from queries import retry_batches
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+IDS = [f"id{i}" for i in range(10)]
+
+
+def load_asyncio_main():
+    # Loaded by path: app/main.py is already importable as "main".
+    spec = importlib.util.spec_from_file_location(
+        "asyncio_main", os.path.join(ROOT, "asyncio_alternative", "main.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeEndpoint:
+    """
+    Answers batched corporate queries. Requests holding a poisoned id
+    fail as a whole, broken ids error inside the response, and missing
+    ids come back null.
+    """
+
+    def __init__(self, poisoned=(), broken=(), missing=()):
+        self.poisoned = set(poisoned)
+        self.broken = set(broken)
+        self.missing = set(missing)
+        self.batches = []
+
+    def __call__(self, payload, **kwargs):
+        corp_ids = [
+            payload["variables"][f"id{i}"] for i in range(len(payload["variables"]))
+        ]
+        self.batches.append(corp_ids)
+        if self.poisoned & set(corp_ids):
+            raise requests.HTTPError("503 Server Error")
+
+        data, errors = {}, []
+        for i, corp_id in enumerate(corp_ids):
+            if corp_id in self.broken:
+                data[f"c{i}"] = None
+                errors.append({"message": "boom", "path": [f"c{i}"]})
+            elif corp_id in self.missing:
+                data[f"c{i}"] = None
+            else:
+                data[f"c{i}"] = {"id": corp_id}
+        return {"data": data, "errors": errors}
+
+
+def fetch(endpoint, monkeypatch):
+    monkeypatch.setattr(tasks, "post_request", endpoint)
+    return [corp["id"] for corp in tasks.fetch_corp_batch(list(IDS))]
+
+
+def fetch_async(endpoint):
+    class Crawler:
+        async def post(self, payload):
+            return endpoint(payload)
+
+    module = load_asyncio_main()
+    corps = asyncio.run(module.get_corp_batch(Crawler(), list(IDS)))
+    return [corp["id"] for corp in corps]
+
+
+def test_retry_batches():
+    assert retry_batches(IDS, []) == []
+    assert retry_batches(IDS[:1], IDS[:1]) == []
+    assert retry_batches(IDS, IDS[3:5]) == [IDS[3:5]]
+    assert retry_batches(IDS, IDS) == [IDS[:5], IDS[5:]]
+
+
+def test_clean_batch_is_one_request(monkeypatch):
+    endpoint = FakeEndpoint()
+    assert fetch(endpoint, monkeypatch) == IDS
+    assert endpoint.batches == [IDS]
+
+
+def test_failed_request_is_bisected_down_to_the_bad_id(monkeypatch):
+    endpoint = FakeEndpoint(poisoned={"id6"})
+    assert fetch(endpoint, monkeypatch) == [i for i in IDS if i != "id6"]
+    assert ["id6"] in endpoint.batches
+    # Every good id is fetched by exactly one successful request.
+    good = [batch for batch in endpoint.batches if "id6" not in batch]
+    assert sorted(sum(good, [])) == sorted(i for i in IDS if i != "id6")
+
+
+def test_errored_ids_are_retried_and_order_kept(monkeypatch):
+    endpoint = FakeEndpoint(broken={"id2", "id7"}, missing={"id4"})
+    expected = [i for i in IDS if i not in {"id2", "id7", "id4"}]
+    assert fetch(endpoint, monkeypatch) == expected
+    assert endpoint.batches[1] == ["id2", "id7"]
+
+
+@pytest.mark.parametrize(
+    "faults",
+    [{"poisoned": {"id0", "id9"}}, {"broken": {"id1", "id5"}, "missing": {"id3"}}],
+)
+def test_asyncio_crawler_matches_celery(faults, monkeypatch):
+    celery_ids = fetch(FakeEndpoint(**faults), monkeypatch)
+    assert fetch_async(FakeEndpoint(**faults)) == celery_ids
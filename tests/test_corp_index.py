@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from corp_index import CorpIndex, TrigramIndex
+from corp_store import CorpStore, write_store
+
+
+def scan(corps, filter_criteria):
+    """
+    The row-by-row filter the indexes replace.
+    """
+    rows = []
+    for i, corp in enumerate(corps):
+        matched = True
+        for key, value in filter_criteria.items():
+            if key == "themes":
+                matched &= any(theme in corp["themes"] for theme in value)
+            else:
+                matched &= value.lower() in str(corp.get(key, "")).lower()
+        if matched:
+            rows.append(i)
+    return rows
+
+
+@pytest.fixture(scope="module")
+def index(corps, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("index") / "store")
+    write_store(corps, path)
+    return CorpIndex(CorpStore(path))
+
+
+FILTERS = [
+    {},
+    {"themes": ["Artificial Intelligence"]},
+    {"themes": ["Artificial Intelligence", "Machine Learning"]},
+    {"themes": ["No Such Theme"]},
+    {"hq_country": "germany"},
+    {"hq_country": "United"},
+    {"hq_city": "Munich"},
+    {"hq_city": "BERLIN"},
+    {"hq_country": "France", "themes": ["Automotive", "Robotics"]},
+    {"hq_country": "Germany", "hq_city": "Berlin"},
+    {"hq_country": "Atlantis"},
+    {"name": "bank"},
+    {"name": "AG"},
+    {"name": "a"},
+    {"description": "software"},
+    {"description": "insurance", "hq_country": "Germany"},
+    {"description": "tech"},
+    {"name": "zzz"},
+]
+
+
+@pytest.mark.parametrize("filter_criteria", FILTERS)
+def test_filter_matches_scan(corps, index, filter_criteria):
+    rows = index.filter(filter_criteria)
+    assert rows.tolist() == scan(corps, filter_criteria)
+
+
+def test_filter_of_unknown_column_matches_nothing(index):
+    assert len(index.filter({"revenue": "big"})) == 0
+
+
+def test_filter_result_is_sorted_row_ids(index):
+    rows = index.filter({"themes": ["Machine Learning", "Automotive"]})
+    assert rows.dtype == np.int64
+    assert np.all(np.diff(rows) > 0)
+
+
+@pytest.mark.parametrize("value", ["", "a", "ab", "abc", "bcd", "cab", "xyz", "abcd"])
+def test_trigram_search_matches_scan(value):
+    strings = ["abcd", "bcda", "cabc", "ab", "", "xabcx"]
+    expected = [code for code, text in enumerate(strings) if value in text]
+    assert sorted(TrigramIndex(strings).search(value)) == expected
@@ -0,0 +1,75 @@
+import copy
+import os
+import numpy as np
+from corp_store import CorpStore, read_meta, write_store
+
+
+def inodes(path):
+    return {name: os.stat(os.path.join(path, name)).st_ino for name in os.listdir(path)}
+
+
+def test_store_round_trips_records(corps, tmp_path):
+    path = str(tmp_path / "store")
+    write_store(corps, path)
+    store = CorpStore(path)
+
+    assert len(store) == len(corps)
+    for i in (0, len(corps) // 2, len(corps) - 1):
+        row = store.row(i)
+        assert {key: row[key] for key in corps[i]} == corps[i]
+
+
+def test_unchanged_rewrite_hard_links_every_column(corps, tmp_path):
+    path = str(tmp_path / "store")
+    first = write_store(corps, path)
+    before = inodes(path)
+
+    assert write_store(corps, path) == []
+    after = inodes(path)
+    assert {name: after[name] for name in before if name != "meta.json"} == {
+        name: inode for name, inode in before.items() if name != "meta.json"
+    }
+    assert len(first) == len(before) - 1
+
+
+def test_only_changed_columns_are_rewritten(corps, tmp_path):
+    path = str(tmp_path / "store")
+    write_store(corps, path)
+    version = read_meta(path)["version"]
+    before = inodes(path)
+
+    changed = copy.deepcopy(corps)
+    changed[0]["name"] = "Renamed Corporate"
+    written = write_store(changed, path)
+    after = inodes(path)
+
+    assert "name.dict" in written
+    assert set(written) <= {"name.codes", "name.dict", "name.dict_offsets"}
+    for name in before:
+        if name != "meta.json" and name[:-4] not in written:
+            assert after[name] == before[name]
+    assert read_meta(path)["version"] != version
+    assert CorpStore(path).row(0)["name"] == "Renamed Corporate"
+
+
+def test_open_store_keeps_reading_the_old_version(corps, tmp_path):
+    path = str(tmp_path / "store")
+    write_store(corps, path)
+    store = CorpStore(path)
+
+    changed = copy.deepcopy(corps)
+    changed[0]["name"] = "Renamed Corporate"
+    write_store(changed, path)
+
+    assert store.row(0)["name"] == corps[0]["name"]
+
+
+def test_extra_arrays_and_skipped_names_are_recorded(corps, tmp_path):
+    path = str(tmp_path / "store")
+    lat = np.linspace(-90, 90, len(corps))
+    write_store(corps, path, extra={"geo.lat": lat}, skipped=["embedding.local.themes"])
+
+    meta = read_meta(path)
+    assert "geo.lat" in meta["columns"]
+    assert meta["skipped"] == ["embedding.local.themes"]
+    np.testing.assert_array_equal(CorpStore(path).array("geo.lat"), lat)
@@ -0,0 +1,81 @@
+import pytest
+from fast_parser import FastParser
+
+THEMES = [
+    "Artificial Intelligence",
+    "Machine Learning",
+    "Health Care",
+    "Internet of Things",
+    "FinTech",
+]
+COUNTRIES = ["Germany", "France", "United States", "United Kingdom"]
+CITIES = ["Berlin", "Munich", "Paris", "New York", "Hard"]
+
+
+@pytest.fixture(scope="module")
+def parser():
+    return FastParser(THEMES, COUNTRIES, CITIES)
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        (
+            "Get the companies in AI and group them by their location",
+            {
+                "filter": {"themes": ["Artificial Intelligence"]},
+                "group_by": "geography",
+            },
+        ),
+        (
+            "German corporates working on machine learning",
+            {
+                "filter": {"hq_country": "Germany", "themes": ["Machine Learning"]},
+                "group_by": "default",
+            },
+        ),
+        (
+            "companies in New York grouped by sector",
+            {"filter": {"hq_city": "New York"}, "group_by": "themes"},
+        ),
+        (
+            "fintech and healthcare firms in the UK, clustered geographically",
+            {
+                "filter": {
+                    "hq_country": "United Kingdom",
+                    "themes": ["FinTech", "Health Care"],
+                },
+                "group_by": "geography",
+            },
+        ),
+        (
+            "IoT companies in Paris",
+            {
+                "filter": {"hq_city": "Paris", "themes": ["Internet of Things"]},
+                "group_by": "default",
+            },
+        ),
+    ],
+)
+def test_parses_dictionary_queries(parser, query, expected):
+    assert parser.parse(query) == expected
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        # Content words the dictionaries do not know.
+        "companies building rockets in Germany",
+        "large AI companies",
+        # Several values for one string filter.
+        "companies in Germany or France",
+        # Conflicting and unknown groupings.
+        "AI companies grouped by theme and by country",
+        "AI companies by revenue",
+        # Only function words, or a city that is also a plain word.
+        "show me the companies",
+        "hard problems",
+    ],
+)
+def test_leaves_unclear_queries_to_the_llm(parser, query):
+    assert parser.parse(query) is None
@@ -0,0 +1,69 @@
+import pytest
+import jobs
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture(autouse=True)
+def client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(jobs, "client", client)
+    return client
+
+
+def started_job(pages_total):
+    jobs.create_job("job")
+    jobs.start_job("job", pages_total)
+
+
+def test_job_completes_when_every_page_is_done():
+    started_job(3)
+    jobs.record_page_done("job")
+    jobs.record_page_done("job")
+    assert jobs.job_status("job")["status"] == "in progress"
+
+    jobs.record_page_done("job")
+    status = jobs.job_status("job")
+    assert status["status"] == "completed"
+    assert status["pages_done"] == 3
+    assert status["pages_failed"] == 0
+
+
+def test_job_with_a_failed_page_ends_failed():
+    started_job(2)
+    jobs.record_page_done("job", failed=True)
+    assert jobs.job_status("job")["status"] == "in progress"
+
+    jobs.record_page_done("job")
+    status = jobs.job_status("job")
+    assert status["status"] == "failed"
+    assert status["pages_failed"] == 1
+
+
+def test_job_without_pages_completes_at_start():
+    started_job(0)
+    assert jobs.job_status("job")["status"] == "completed"
+
+
+def test_failed_discovery_keeps_its_error():
+    jobs.create_job("job")
+    jobs.fail_job("job", "Page discovery failed")
+    status = jobs.job_status("job")
+    assert status["status"] == "failed"
+    assert status["error"] == "Page discovery failed"
+
+
+def test_requests_and_latency_are_tracked():
+    started_job(1)
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        jobs.record_request("job", latency)
+    status = jobs.job_status("job")
+    assert status["requests"] == 4
+    assert status["latency_p50_ms"] == 200.0
+    assert status["latency_p95_ms"] == 400.0
+
+
+def test_tracking_without_job_id_is_a_no_op(client):
+    jobs.record_page_done(None)
+    jobs.record_request(None, 0.1)
+    assert client.keys() == []
@@ -0,0 +1,68 @@
+import json
+import pytest
+import manifest
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(manifest, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(manifest, "MANIFEST_DIR", str(tmp_path / "manifest"))
+    return tmp_path
+
+
+def corp(corp_id, name=None):
+    return {"id": corp_id, "name": name or corp_id}
+
+
+def read_shard(page):
+    with open(manifest.shard_path(page), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_first_merge_writes_shard_in_page_order():
+    assert manifest.merge_shard(1, ["a", "b", "c"], [corp("c"), corp("a"), corp("b")])
+    assert [c["id"] for c in read_shard(1)] == ["a", "b", "c"]
+    assert set(manifest.load_manifest(1)) == {"a", "b", "c"}
+
+
+def test_unchanged_refresh_keeps_shard_but_updates_fetch_times():
+    manifest.merge_shard(1, ["a", "b"], [corp("a"), corp("b")])
+    before = manifest.load_manifest(1)
+    manifest.save_manifest(1, {k: {**v, "fetched_at": 0} for k, v in before.items()})
+
+    assert not manifest.merge_shard(1, ["a", "b"], [corp("a")])
+    after = manifest.load_manifest(1)
+    assert after["a"]["fetched_at"] > 0
+    assert after["b"]["fetched_at"] == 0
+
+
+def test_changed_record_rewrites_shard():
+    manifest.merge_shard(1, ["a", "b"], [corp("a"), corp("b")])
+    assert manifest.merge_shard(1, ["a", "b"], [corp("b", "renamed")])
+    assert read_shard(1) == [corp("a"), corp("b", "renamed")]
+
+
+def test_membership_changes_rewrite_shard():
+    manifest.merge_shard(1, ["a", "b", "c"], [corp("a"), corp("b"), corp("c")])
+    assert manifest.merge_shard(1, ["c", "a", "d"], [corp("d")])
+    assert [c["id"] for c in read_shard(1)] == ["c", "a", "d"]
+    assert set(manifest.load_manifest(1)) == {"a", "c", "d"}
+
+
+def test_reordered_page_alone_does_not_rewrite_shard():
+    manifest.merge_shard(1, ["a", "b"], [corp("a"), corp("b")])
+    assert not manifest.merge_shard(1, ["b", "a"], [])
+
+
+def test_missing_record_is_dropped():
+    assert manifest.merge_shard(1, ["a", "b"], [corp("a")])
+    assert read_shard(1) == [corp("a")]
+
+
+def test_ids_to_refresh():
+    manifest.merge_shard(1, ["a", "b"], [corp("a"), corp("b")])
+    entries = manifest.load_manifest(1)
+    entries["b"]["fetched_at"] = 0
+    manifest.save_manifest(1, entries)
+
+    assert manifest.ids_to_refresh(1, ["a", "b", "c"], max_age=3600) == ["b", "c"]
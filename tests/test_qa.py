@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from sklearn.datasets import make_blobs
+from sklearn.metrics import (
+    calinski_harabasz_score,
+    davies_bouldin_score,
+    silhouette_score,
+)
+import qa
+
+
+@pytest.fixture
+def blobs():
+    return make_blobs(n_samples=300, centers=4, n_features=8, random_state=0)
+
+
+def reference(X, labels):
+    return {
+        "silhouette": silhouette_score(X, labels),
+        "calinski-harabasz": calinski_harabasz_score(X, labels),
+        "davies-bouldin": davies_bouldin_score(X, labels),
+    }
+
+
+def test_metrics_match_sklearn(blobs):
+    X, labels = blobs
+    metrics = qa.cluster_metrics(X, labels)
+    for name, value in reference(X, labels).items():
+        assert metrics[name] == pytest.approx(value, rel=1e-6)
+    assert metrics["silhouette_ci"] is None
+
+
+def test_metrics_match_sklearn_on_sparse_input(blobs):
+    X, labels = blobs
+    X = np.abs(X)
+    metrics = qa.cluster_metrics(sparse.csr_matrix(X), labels)
+    for name, value in reference(X, labels).items():
+        assert metrics[name] == pytest.approx(value, rel=1e-6)
+
+
+def test_metrics_match_sklearn_with_singleton_cluster(blobs):
+    X, labels = blobs
+    labels = labels.copy()
+    labels[0] = 9
+    metrics = qa.cluster_metrics(X, labels)
+    for name, value in reference(X, labels).items():
+        assert metrics[name] == pytest.approx(value, rel=1e-6)
+
+
+def test_sampled_silhouette_interval_covers_exact_score(blobs, monkeypatch):
+    X, labels = blobs
+    monkeypatch.setattr(qa, "QA_SAMPLE_THRESHOLD", 100)
+    monkeypatch.setattr(qa, "QA_SAMPLE_SIZE", 150)
+    metrics = qa.cluster_metrics(X, labels)
+
+    low, high = metrics["silhouette_ci"]
+    assert low <= silhouette_score(X, labels) <= high
+
+
+def test_evaluate_leaves_noise_out(blobs):
+    X, labels = blobs
+    noisy = labels.copy()
+    noisy[:30] = -1
+    results = qa.evaluate(X, noisy)
+
+    assert results["noise"] == pytest.approx(0.1)
+    assert results["silhouette"] == pytest.approx(
+        silhouette_score(X[30:], labels[30:]), rel=1e-6
+    )
+    assert results["verdict"] == "pass"
+
+
+def test_evaluate_warns_on_a_single_cluster(blobs):
+    X, _ = blobs
+    results = qa.evaluate(X, np.zeros(len(X), dtype=int))
+    assert results["verdict"] == "warn"
+    assert results["reasons"] == ["Fewer than two clusters"]